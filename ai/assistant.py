@@ -1,65 +1,97 @@
+import asyncio
 import io
 import json
 import os
+import time
+from typing import Optional
 
 import anthropic
+import httpx
 from dotenv import load_dotenv
 from telegram import Update
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
+from ai.conversation_store import NO_ANSWER, ConversationStore, final_answer_content, to_message_param
 from ai.prompts.main_prompt import MAIN_PROMPT
 from ai.tool_handler import ToolHandler
+from ai.usage_tracker import UsageTracker
+from bot.file_id_cache import TelegramFileIdCache
+from bot.progressive_reply import ProgressiveReply
+from bot.telegram_downloader import TelegramFileDownloader
 from models.ai_tool_result import AiToolResult
 from models.claude_message import ClaudeMessage
+from services.http_client import get_http_client
 from utils.logger import logger
 
 load_dotenv()
 
 
-def load_tool_definitions():
-    tools = []
-    base_path = 'ai/tools_definition'
-    categories = ['audio']  # , 'users', 'events']
-
-    try:
-        for category in categories:
-            category_path = os.path.join(base_path, category)
-            if not os.path.exists(category_path):
-                logger.warning(f"Category path not found: {category_path}")
-                continue
-
-            for filename in os.listdir(category_path):
-                if filename.endswith('.json'):
-                    file_path = os.path.join(category_path, filename)
-                    logger.debug(f"Loading tool from: {file_path}")
-                    with open(file_path, 'r') as file:
-                        tool = json.load(file)
-                        tools.append(tool)
-
-        logger.info(f"Loaded tools: {[t['name'] for t in tools]}")
-        return tools
-    except Exception as e:
-        logger.error(f"Error loading tool definitions: {e}", exc_info=True)
-        return []
+def with_cache_breakpoint(message: dict) -> dict:
+    """Return a copy of message whose last content block carries an ephemeral cache_control marker"""
+    content = message["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    else:
+        content = to_message_param(content)
+    return {**message, "content": [*content[:-1], {**content[-1], "cache_control": {"type": "ephemeral"}}]}
 
 
 class Assistant:
     def __init__(self):
         logger.info("Initializing Assistant...")
-        self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-        logger.info("Loading tool definitions...")
-        self.tools = load_tool_definitions()
-        # logger.debug(f"Loaded tools configuration: {json.dumps(self.tools, indent=2)}")
+        max_concurrent_requests = int(os.getenv("AI_MAX_CONCURRENT_REQUESTS", 8))
+        self.client = anthropic.AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            timeout=float(os.getenv("AI_REQUEST_TIMEOUT", 60)),
+            max_retries=int(os.getenv("AI_MAX_RETRIES", 2)),
+            # A plain httpx client: DefaultAsyncHttpxClient needs a newer httpx than python-telegram-bot 20.5 allows
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max_concurrent_requests,
+                    max_keepalive_connections=max_concurrent_requests
+                )
+            )
+        )
+        # Bounds in-flight Claude requests across all chats sharing this assistant
+        self.request_limiter = asyncio.Semaphore(max_concurrent_requests)
         self.tool_handler = ToolHandler()
+        self.tool_registry = self.tool_handler.registry
+        # System prompt and tool schemas are identical across requests, so both are cached by the API
+        self.tools = self.tool_registry.payload
+        self.system_prompt = [{"type": "text", "text": MAIN_PROMPT, "cache_control": {"type": "ephemeral"}}]
+        self.conversations = ConversationStore()
+        self.usage = UsageTracker()
+        self.audio_store = self.tool_handler.audio_store
+        self.file_ids = TelegramFileIdCache()
+        self.telegram_files = TelegramFileDownloader()
+        self.max_tool_iterations = int(os.getenv("AI_MAX_TOOL_ITERATIONS", 5))
+        self.conversation_budget = float(os.getenv("AI_CONVERSATION_BUDGET", 180))
         logger.info("Assistant initialization completed")
 
+    async def start(self, application=None):
+        # Sharded webhook workers share one Jamendo catalog, so only the first one keeps it filled
+        if int(os.getenv("BOT_WORKER_INDEX", 0)) == 0:
+            self.tool_handler.jamendo_client.start_prefetch()
+
+    async def close(self, application=None):
+        await self.tool_handler.jamendo_client.stop_prefetch()
+        await self.client.close()
+        await get_http_client().close()
+        self.audio_store.close()
+
     async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        reply = None
         try:
             if update.message.audio:
-                file_obj = await context.bot.get_file(update.message.audio.file_id)
-                file_data = await file_obj.download_as_bytearray()
+                # Forwarded copies of a track share one file_unique_id and are downloaded once, straight to disk
+                audio = update.message.audio
+                download = await self.telegram_files.fetch(context.bot, audio.file_id, audio.file_unique_id)
+                if download is None:
+                    await update.message.reply_text("Could not download the audio")
+                    return
                 message_id = str(update.message.message_id)
-                context.user_data[message_id] = file_data.hex()
+                await asyncio.to_thread(self.audio_store.put_file, str(update.effective_user.id), message_id, download.path)
                 shared_prompt = f"An audio file has been uploaded (message_id: {message_id}). "
                 if update.message.caption:
                     message_text = f"{shared_prompt}{update.message.caption}"
@@ -70,74 +102,148 @@ class Assistant:
 
             logger.debug(f"Prepared message text: {message_text}")
 
+            chat_id = str(update.effective_chat.id)
+            history = self.conversations.get_history(chat_id)
             message = ClaudeMessage.user_message(message_text)
-            response = await self.handle_conversation([message.to_dict()], context)
+            messages = [*history, message.to_dict()]
+            reply = ProgressiveReply(update.message)
+            response = await self.handle_conversation(messages, context, reply)
+
+            turn = messages[len(history):]
+            if turn[-1]["role"] != "assistant":
+                # Keep roles alternating for the next request when the turn ended without a final answer
+                answer = (response.get_telegram_answer() if response else None) or NO_ANSWER
+                turn.append({"role": "assistant", "content": answer})
+            self.conversations.add_turn(chat_id, turn)
 
             if response:
-                await update.message.reply_text(response.get_telegram_answer())
+                await reply.finish(response.get_telegram_answer())
 
         except Exception as e:
             logger.error(f"Error in handle_text: {e}", exc_info=True)
-            await update.message.reply_text("An error occurred")
+            if reply is not None:
+                await reply.finish("An error occurred")
+            else:
+                await update.message.reply_text("An error occurred")
 
-    async def handle_conversation(self, messages: list, context: ContextTypes.DEFAULT_TYPE) -> AiToolResult:
+    async def handle_conversation(self, messages: list, context: ContextTypes.DEFAULT_TYPE,
+                                  reply: ProgressiveReply = None) -> AiToolResult:
         try:
-            logger.info(f"Sending request to Claude with {len(messages)} messages")
-
-            response = self.client.messages.create(
-                model=os.getenv("AI_MODEL"),
-                max_tokens=1024,
-                system=MAIN_PROMPT,
-                messages=messages,
-                tools=self.tools
-            )
+            deadline = time.monotonic() + self.conversation_budget
+            last_result = None
 
-            if response.stop_reason == "tool_use":
-                tool_use = response.content[-1]
-                tool_name = tool_use.name
-                tool_input = tool_use.input
-                logger.info(f"Tool requested: {tool_name}")
+            for iteration in range(self.max_tool_iterations):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
 
-                tool_result = await self.process_tool_call(tool_name, tool_input, context)
-                logger.info(f"Tool result: {tool_result.to_json()[:200]}...")
-                messages.extend(tool_result.get_claude_messages(tool_use.id, response.content))
-                return tool_result
-            else:
-                return AiToolResult.from_text(response.content[0].text)
+                logger.info(f"Sending request to Claude with {len(messages)} messages (iteration {iteration + 1})")
+                tool_tasks = {}
+
+                async def limited_response():
+                    async with self.request_limiter:
+                        return await self.stream_response(messages, context, reply, tool_tasks)
+
+                try:
+                    # Waiting for a free request slot counts against the latency budget too
+                    response = await asyncio.wait_for(limited_response(), timeout=remaining)
+                except BaseException:
+                    for task in tool_tasks.values():
+                        task.cancel()
+                    raise
 
+                if response.stop_reason != "tool_use":
+                    # Tools started mid-stream whose calls the response did not complete (e.g. max_tokens)
+                    # are stopped: their results could never be reported back
+                    for task in tool_tasks.values():
+                        task.cancel()
+                    await asyncio.gather(*tool_tasks.values(), return_exceptions=True)
+                    text = "".join(block.text for block in response.content if block.type == "text")
+                    messages.append({"role": "assistant", "content": final_answer_content(response.content)})
+                    return AiToolResult.from_text(text)
+
+                tool_uses = [block for block in response.content if block.type == "tool_use"]
+                logger.info(f"Tools requested: {[tool_use.name for tool_use in tool_uses]}")
+
+                # Most tools are already running: they were started as soon as their input was complete
+                for tool_use in tool_uses:
+                    if tool_use.id not in tool_tasks:
+                        tool_tasks[tool_use.id] = asyncio.create_task(
+                            self.process_tool_call(tool_use.name, tool_use.input, context)
+                        )
+                try:
+                    tool_results = await asyncio.wait_for(
+                        asyncio.gather(*(tool_tasks[tool_use.id] for tool_use in tool_uses)),
+                        timeout=max(deadline - time.monotonic(), 0)
+                    )
+                except asyncio.TimeoutError:
+                    for task in tool_tasks.values():
+                        task.cancel()
+                    raise
+                for tool_use, tool_result in zip(tool_uses, tool_results):
+                    logger.info(f"Tool result for {tool_use.name}: {tool_result.to_json()[:200]}...")
+
+                messages.extend(AiToolResult.get_claude_turn_messages(
+                    response.content,
+                    [(tool_use.id, tool_result) for tool_use, tool_result in zip(tool_uses, tool_results)]
+                ))
+                last_result = tool_results[-1]
+
+            logger.warning("Conversation stopped: tool iteration or latency budget exhausted")
+            return last_result or AiToolResult.from_error("Request took too long to complete")
+
+        except asyncio.TimeoutError:
+            logger.warning("Conversation stopped: latency budget exhausted")
+            return AiToolResult.from_error("Request took too long to complete")
         except Exception as e:
             logger.error(f"Claude API error: {str(e)}", exc_info=True)
             raise
 
+    async def stream_response(self, messages: list, context: ContextTypes.DEFAULT_TYPE,
+                              reply: Optional[ProgressiveReply], tool_tasks: dict):
+        """Stream one Claude response, showing its text as it arrives and starting tools as their blocks complete"""
+        started = time.monotonic()
+        first_token_latency = None
+        async with self.client.messages.stream(
+            model=os.getenv("AI_MODEL"),
+            max_tokens=1024,
+            system=self.system_prompt,
+            # Marking the newest message caches the whole conversation prefix for the next request
+            messages=[*messages[:-1], with_cache_breakpoint(messages[-1])],
+            tools=self.tools
+        ) as stream:
+            async for event in stream:
+                if first_token_latency is None and event.type == "content_block_start":
+                    first_token_latency = time.monotonic() - started
+                if event.type == "text" and reply is not None:
+                    reply.update(event.snapshot)
+                elif event.type == "content_block_stop" and event.content_block.type == "tool_use":
+                    block = event.content_block
+                    logger.debug(f"Starting {block.name} while the response is still streaming")
+                    tool_tasks[block.id] = asyncio.create_task(self.process_tool_call(block.name, block.input, context))
+            response = await stream.get_final_message()
+
+        self.usage.record(str(context._chat_id), response.usage, time.monotonic() - started, first_token_latency)
+        return response
+
     async def process_tool_call(self, tool_name: str, tool_input: dict, context: ContextTypes.DEFAULT_TYPE) -> AiToolResult:
         try:
-            handler = self.tool_handler.get_handler(tool_name)
-            if not handler:
+            tool = self.tool_registry.get(tool_name)
+            if not tool:
                 logger.error(f"Unknown tool: {tool_name}")
                 return AiToolResult.from_error(f"Unknown tool: {tool_name}")
 
+            validation_error = tool.validate(tool_input)
+            if validation_error:
+                logger.warning(f"Rejected {tool_name} input: {validation_error}")
+                return AiToolResult.from_error(f"Invalid input for {tool_name}: {validation_error}")
+
             logger.debug(f"Processing tool call: {tool_name} with input: {json.dumps(tool_input, indent=2)}")
 
-            if tool_name == "recognize_song" :
-                result = await handler(tool_input, context.user_data)
-            elif tool_name == "generate_audio_fragment":
-                result = await handler(tool_input, context.user_data)
-                if result.success:
-                    audio_bytes = result.get_audio_bytes()
-                    audio_file = io.BytesIO(audio_bytes)
-                    audio_file.name = 'tts_audio.mp3'
-                    await context.bot.send_audio(chat_id=context._chat_id, audio=audio_file)
-                return result
-            elif tool_name == "handle_merge_audio":
-                result = await handler(tool_input)
-                if result.success:
-                    audio_bytes = result.get_audio_bytes()
-                    audio_file = io.BytesIO(audio_bytes)
-                    audio_file.name = 'merged_audio.mp3'
-                    await context.bot.send_audio(chat_id=context._chat_id, audio=audio_file)
-                return result
-            else:
-                result = await handler(tool_input)
+            call_arguments = {"owner": str(context._user_id), "chat_id": str(context._chat_id)}
+            result = await tool.handler(tool_input, **{name: call_arguments[name] for name in tool.call_arguments})
+            if tool.audio_filename and result.success:
+                await self.send_stored_audio(context, result.get_audio_ref(), tool.audio_filename)
 
             logger.debug(f"Tool call result: {result}")
             return result
@@ -145,3 +251,28 @@ class Assistant:
         except Exception as e:
             logger.error(f"Error in tool call: {e}", exc_info=True)
             return AiToolResult.from_exception(e)
+
+    async def send_stored_audio(self, context: ContextTypes.DEFAULT_TYPE, audio_ref: str, filename: str):
+        audio = await asyncio.to_thread(self.audio_store.get, str(context._user_id), audio_ref)
+        if audio is None:
+            logger.warning(f"Audio {audio_ref} is no longer stored, nothing to send")
+            return
+
+        # Repeated intros and merges are sent by the file_id of their first upload instead of re-uploading
+        bot_id = context.bot.id
+        content_hash = await asyncio.to_thread(self.file_ids.make_key, audio)
+        file_id = await asyncio.to_thread(self.file_ids.get, bot_id, content_hash)
+        if file_id:
+            try:
+                await context.bot.send_audio(chat_id=context._chat_id, audio=file_id)
+                return
+            except BadRequest as e:
+                logger.warning(f"Cached file id for {audio_ref} was rejected, uploading again: {e}")
+                await asyncio.to_thread(self.file_ids.forget, bot_id, content_hash)
+
+        # PTB reads the whole upload into the request body, so this is the only copy made
+        audio_file = io.BytesIO(audio)
+        audio_file.name = filename
+        message = await context.bot.send_audio(chat_id=context._chat_id, audio=audio_file)
+        if message.audio:
+            await asyncio.to_thread(self.file_ids.put, bot_id, content_hash, message.audio.file_id, len(audio))
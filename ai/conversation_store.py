@@ -0,0 +1,110 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+NO_ANSWER = "No answer"
+
+
+def estimate_tokens(messages: List[dict]) -> int:
+    # Roughly four characters per token; close enough to budget history without a counting request
+    return len(json.dumps(messages, ensure_ascii=False)) // 4
+
+
+def to_message_param(content):
+    """Convert SDK content blocks into plain dicts that can be stored and sent back"""
+    if isinstance(content, str):
+        return content
+    return [
+        block.model_dump(exclude_none=True) if hasattr(block, "model_dump") else block
+        for block in content
+    ]
+
+
+def final_answer_content(content) -> List[dict]:
+    """Content of an assistant message that ends a turn, in a form the API accepts back as history.
+
+    tool_use blocks are dropped because they will never get a tool_result (e.g. when
+    the response hit max_tokens), and an answer left without text gets a placeholder.
+    """
+    blocks = [
+        block for block in to_message_param(content)
+        if block.get("type") != "tool_use" and not (block.get("type") == "text" and not block.get("text", "").strip())
+    ]
+    return blocks or [{"type": "text", "text": NO_ANSWER}]
+
+
+class _Conversation:
+    def __init__(self):
+        self.turns: List[List[dict]] = []
+        self.tokens: List[int] = []
+        self.last_access = time.monotonic()
+
+
+class ConversationStore:
+    """Per-chat Claude conversation history.
+
+    History is kept as whole turns (the user message, any tool calls and results,
+    and the final answer) so truncation never separates a tool_use from its
+    tool_result. The oldest turns are dropped once a chat exceeds its token
+    budget; idle chats expire and the number of chats is bounded.
+    """
+
+    def __init__(self, token_budget: int = None, max_chats: int = None, ttl: float = None):
+        self.token_budget = token_budget or int(os.getenv("AI_HISTORY_TOKEN_BUDGET", 8000))
+        self.max_chats = max_chats or int(os.getenv("AI_HISTORY_MAX_CHATS", 1000))
+        self.ttl = ttl or float(os.getenv("AI_HISTORY_TTL", 6 * 3600))
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+
+    def get_history(self, chat_id: str) -> List[dict]:
+        self._purge_expired()
+        conversation = self._conversations.get(chat_id)
+        if conversation is None:
+            return []
+        conversation.last_access = time.monotonic()
+        self._conversations.move_to_end(chat_id)
+        return [message for turn in conversation.turns for message in turn]
+
+    def add_turn(self, chat_id: str, messages: List[dict]):
+        turn = [{"role": message["role"], "content": to_message_param(message["content"])} for message in messages]
+        if not turn:
+            return
+
+        conversation = self._conversations.pop(chat_id, None) or _Conversation()
+        conversation.turns.append(turn)
+        conversation.tokens.append(estimate_tokens(turn))
+        conversation.last_access = time.monotonic()
+        self._conversations[chat_id] = conversation
+
+        while len(conversation.turns) > 1 and sum(conversation.tokens) > self.token_budget:
+            conversation.turns.pop(0)
+            conversation.tokens.pop(0)
+            logger.debug(f"Dropped oldest turn of chat {chat_id} to stay within {self.token_budget} tokens")
+
+        while len(self._conversations) > self.max_chats:
+            self._conversations.popitem(last=False)
+
+    def clear(self, chat_id: str):
+        self._conversations.pop(chat_id, None)
+
+    def stats(self) -> Dict:
+        return {
+            "chats": len(self._conversations),
+            "turns": sum(len(c.turns) for c in self._conversations.values()),
+            "tokens": sum(sum(c.tokens) for c in self._conversations.values())
+        }
+
+    def _purge_expired(self):
+        threshold = time.monotonic() - self.ttl
+        while self._conversations:
+            chat_id, conversation = next(iter(self._conversations.items()))
+            if conversation.last_access > threshold:
+                break
+            del self._conversations[chat_id]
@@ -1,14 +1,24 @@
-import json
+import asyncio
 import logging
+import os
+import uuid
+from dataclasses import asdict
 from datetime import datetime
 
+from ai.tool_registry import ToolRegistry
 from models.Event import Event, Precision, EventType
+from models.SoundFragment import SoundFragment
 from models.ai_tool_result import AiToolResult
 from services.audd_client import AudDAPIClient
+from services.audio_store import AudioBlobStore
 from services.event_repository import EventRepository
 from services.file_processor import LocalAudioProcessor
-from services.google_tts_client import GoogleTTSClient
+from services.google_tts_client import get_tts_client
 from services.jamendo_client import JamendoAPIClient
+from services.pubsub_client import SoundFragmentPublisher
+from services.recognition_cache import RecognitionCache
+from services.recognition_router import RecognitionRouter
+from services.shazam_client import ShazamAPIClient
 from services.user_storage import UserStorageClient
 
 logger = logging.getLogger(__name__)
@@ -18,96 +28,145 @@ class ToolHandler:
         self.jamendo_client = JamendoAPIClient()
         self.user_client = UserStorageClient()
         self.event_repo = EventRepository()
-        self.shazam_client = AudDAPIClient()
-        self.tts_client = GoogleTTSClient()
         self.audio_processor = LocalAudioProcessor()
+        self.song_recognizer = RecognitionCache(
+            RecognitionRouter({"audd": AudDAPIClient(), "shazam": ShazamAPIClient()}),
+            self.audio_processor
+        )
+        self.tts_client = get_tts_client()
+        self.publisher = SoundFragmentPublisher()
+        self.audio_store = AudioBlobStore()
+        self.registry = ToolRegistry(
+            {
+                "check_user": self.handle_check_user,
+                "register_user": self.handle_register_user,
+                "add_event": self.handle_add_event,
+                "check_today_events": self.handle_check_today_events,
+                "recognize_song": self.handle_recognize_song,
+                "generate_audio_fragment": self.handle_generate_audio_fragment,
+                "merge_audio": self.handle_merge_audio,
+                "get_sound_fragment": self.handle_get_sound_fragment,
+                "publish_sound_fragment": self.handle_publish_sound_fragment,
+            },
+            audio_filenames={
+                "generate_audio_fragment": "tts_audio.mp3",
+                "merge_audio": "merged_audio.mp3",
+            }
+        )
 
-    def get_handler(self, tool_name: str):
-        handlers = {
-            "check_user": self.handle_check_user,
-            "register_user": self.handle_register_user,
-            "add_event": self.handle_add_event,
-            "check_today_events": self.handle_check_today_events,
-            "recognize_song": self.handle_recognize_song,
-            "generate_audio_fragment": self.handle_generate_audio_fragment,
-            "merge_audio": self.handle_merge_audio,
-        }
-        return handlers.get(tool_name)
-
-    async def handle_check_user(self, input_data: dict) -> str:
+    async def handle_check_user(self, input_data: dict) -> AiToolResult:
         result = self.user_client.check_user(input_data['telegramName'])
-        return json.dumps({"status": "success", "exists": bool(result)})
+        return AiToolResult(True, {"exists": bool(result)})
 
-    async def handle_register_user(self, input_data: dict) -> str:
+    async def handle_register_user(self, input_data: dict) -> AiToolResult:
         result = self.user_client.register_user(input_data['telegramName'])
-        return json.dumps({"status": "success" if result else "error"})
+        return AiToolResult(bool(result), {"registered": bool(result)})
 
-    async def handle_add_event(self, input_data: dict) -> str:
+    async def handle_add_event(self, input_data: dict, owner: str) -> AiToolResult:
+        # The author is the user talking to the bot, never a name taken from the model's input
         event = Event(
             around=datetime.fromisoformat(input_data['around']),
             precision=Precision(input_data['precision']),
             description=input_data['description'],
             type=EventType(input_data['type']),
-            author=input_data['author'],
+            author=owner,
             createdAt=datetime.now()
         )
-        event_id = self.event_repo.add_event(event)
-        return json.dumps({
-            "status": "success",
-            "event_id": event_id
-        })
-
-    async def handle_check_today_events(self, input_data: dict) -> str:
-        events_data = self.event_repo.check_what_we_have_today()
-        events = []
-        for event_dict in events_data:
-            try:
-                events.append({
-                    "description": event_dict.get('description'),
-                    "around": event_dict.get('around'),
-                    "precision": event_dict.get('precision'),
-                    "type": event_dict.get('type'),
-                    "author": event_dict.get('author'),
-                    "createdAt": event_dict.get('createdAt')
-                })
-            except Exception as e:
-                logger.error(f"Error processing event: {e}")
-
-        return json.dumps({
-            "status": "success",
-            "events": events
-        })
-
-    async def handle_recognize_song(self, input_data: dict, context_data: dict) -> AiToolResult:
+        event_id = await asyncio.to_thread(self.event_repo.add_event, event)
+        return AiToolResult(True, {"event_id": event_id})
+
+    async def handle_check_today_events(self, input_data: dict, owner: str) -> AiToolResult:
+        events = await asyncio.to_thread(self.event_repo.check_what_we_have_today, owner)
+        return AiToolResult(True, {"events": [event.to_dict() for event in events]})
+
+    async def handle_recognize_song(self, input_data: dict, owner: str) -> AiToolResult:
         try:
-            audio_data = bytes.fromhex(context_data[input_data['message_id']])
-            metadata = await self.shazam_client.detect_song(audio_data)
+            audio_data = await asyncio.to_thread(self.audio_store.get, owner, input_data['message_id'])
+            if audio_data is None:
+                return AiToolResult.from_error(f"Audio for message {input_data['message_id']} is no longer available")
+
+            metadata = await self.song_recognizer.detect_song(audio_data)
+            if not metadata:
+                return AiToolResult.from_error("Could not identify the song")
             return AiToolResult.from_text(f"Found: {metadata.get('title')} - {metadata.get('artist')}")
         except Exception as e:
             logger.error(f"Recognition error: {e}")
             return AiToolResult.from_exception(e)
 
-    async def handle_generate_audio_fragment(self, input_data: dict, context_data: dict) -> AiToolResult:
+    async def handle_generate_audio_fragment(self, input_data: dict, owner: str) -> AiToolResult:
         try:
             speech_data = await self.tts_client.synthesize_speech(
                 text=input_data['text'],
                 voice_name=input_data.get('voice_name', 'en-US-Journey-D'),
                 language_code=input_data.get('language_code', 'en-US')
             )
+            if not speech_data:
+                return AiToolResult.from_error("Speech synthesis failed")
 
-            context_data['last_tts'] = speech_data
-            return AiToolResult.from_audio(speech_data)
+            audio_ref = await asyncio.to_thread(
+                self.audio_store.put, owner, f"tts-{uuid.uuid4().hex[:12]}", speech_data
+            )
+            return AiToolResult.from_audio(audio_ref, len(speech_data), "Intro audio generated")
         except Exception as e:
             logger.error(f"TTS error: {e}")
             return AiToolResult.from_exception(e)
 
-    async def handle_merge_audio(self, input_data: dict) -> AiToolResult:
+    async def handle_merge_audio(self, input_data: dict, owner: str) -> AiToolResult:
         try:
-            intro_audio = bytes.fromhex(input_data['intro_audio'])
-            main_audio = bytes.fromhex(input_data['main_audio'])
+            intro_audio = await asyncio.to_thread(self.audio_store.get, owner, input_data['intro_audio'])
+            main_audio = await asyncio.to_thread(self.audio_store.get, owner, input_data['main_audio'])
+            if intro_audio is None or main_audio is None:
+                return AiToolResult.from_error("Audio to merge is no longer available")
+
+            merged_data = await self.audio_processor.merge_audio_files(intro_audio, main_audio)
+            if not merged_data:
+                return AiToolResult.from_error("Could not merge audio")
 
-            merged_data = self.audio_processor.merge_audio_files(intro_audio, main_audio)
-            return AiToolResult.from_audio(merged_data)
+            audio_ref = await asyncio.to_thread(
+                self.audio_store.put, owner, f"merged-{uuid.uuid4().hex[:12]}", merged_data
+            )
+            return AiToolResult.from_audio(audio_ref, len(merged_data), "Audio merged")
         except Exception as e:
             logger.error(f"Merge error: {e}")
             return AiToolResult.from_exception(e)
+
+    async def handle_get_sound_fragment(self, input_data: dict, owner: str, chat_id: str) -> AiToolResult:
+        try:
+            found = await self.jamendo_client.get_sound_fragment(input_data['genres'], chat_id)
+            if not found:
+                return AiToolResult.from_error(f"No track found for {', '.join(input_data['genres'])}")
+
+            fragment, track_path = found
+            track_size = os.path.getsize(track_path)
+            # Linked into the store from the download cache, the track is never read into memory here
+            audio_ref = await asyncio.to_thread(
+                self.audio_store.put_file, owner, f"track-{uuid.uuid4().hex[:12]}", track_path
+            )
+            return AiToolResult.from_audio(
+                audio_ref,
+                track_size,
+                f"Found '{fragment.name}' by {fragment.author}",
+                {"fragment": asdict(fragment)}
+            )
+        except Exception as e:
+            logger.error(f"Sound fragment error: {e}")
+            return AiToolResult.from_exception(e)
+
+    async def handle_publish_sound_fragment(self, input_data: dict) -> AiToolResult:
+        try:
+            fragment_data = input_data['fragment']
+            fragment = SoundFragment(
+                source=fragment_data['source'],
+                fileUri=fragment_data['fileUri'],
+                name=fragment_data['name'],
+                type=fragment_data['type'],
+                author=fragment_data['author'],
+                createdAt=fragment_data['createdAt'],
+                genre=fragment_data['genre'],
+                album=fragment_data.get('album', '')
+            )
+            message_id = await self.publisher.publish(fragment)
+            return AiToolResult.from_text(f"Published '{fragment.name}' (message {message_id})")
+        except Exception as e:
+            logger.error(f"Publish error: {e}")
+            return AiToolResult.from_exception(e)
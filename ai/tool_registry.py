@@ -0,0 +1,132 @@
+import inspect
+import json
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from jsonschema import Draft202012Validator, SchemaError
+
+from utils.logger import logger
+
+load_dotenv()
+
+TOOLS_DEFINITION_PATH = 'ai/tools_definition'
+# Call details a handler can ask for by naming them as keyword parameters
+_CALL_ARGUMENTS = ('owner', 'chat_id')
+
+
+@dataclass
+class RegisteredTool:
+    name: str
+    definition: dict
+    handler: Callable
+    validator: Draft202012Validator
+    call_arguments: tuple
+    audio_filename: Optional[str] = None
+
+    def validate(self, tool_input: dict) -> Optional[str]:
+        """Return a description of the first schema violation, or None if the input is valid"""
+        error = next(self.validator.iter_errors(tool_input), None)
+        if error is None:
+            return None
+        location = "/".join(str(part) for part in error.absolute_path)
+        return f"{location}: {error.message}" if location else error.message
+
+
+class ToolRegistry:
+    """Tool schemas bound to their handlers once at startup.
+
+    Every definition is checked against its handler when the registry is built:
+    a schema without a handler, an invalid schema or one whose file name does not
+    match the tool name is left out of the payload sent to Claude, and a handler
+    with no schema in any category is reported. Every problem is collected in mismatches.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable], categories: List[str] = None,
+                 audio_filenames: Dict[str, str] = None):
+        self.categories = categories or [
+            category.strip() for category in os.getenv("AI_TOOL_CATEGORIES", "audio").split(",") if category.strip()
+        ]
+        audio_filenames = audio_filenames or {}
+        self.tools: Dict[str, RegisteredTool] = {}
+        self.mismatches: List[str] = []
+
+        for definition in self._load_definitions():
+            name = definition.get('name')
+            if name in self.tools:
+                self._flag(f"Tool {name} is defined more than once")
+                continue
+            handler = handlers.get(name)
+            if handler is None:
+                self._flag(f"Tool {name} has a schema but no handler")
+                continue
+            try:
+                Draft202012Validator.check_schema(definition['input_schema'])
+            except (KeyError, SchemaError) as e:
+                self._flag(f"Tool {name} has an invalid input schema: {e}")
+                continue
+
+            parameters = inspect.signature(handler).parameters
+            self.tools[name] = RegisteredTool(
+                name=name,
+                definition=definition,
+                handler=handler,
+                validator=Draft202012Validator(definition['input_schema']),
+                call_arguments=tuple(argument for argument in _CALL_ARGUMENTS if argument in parameters),
+                audio_filename=audio_filenames.get(name)
+            )
+
+        defined_anywhere = self._defined_names()
+        for name in sorted(handlers.keys() - self.tools.keys()):
+            if name in defined_anywhere:
+                logger.debug(f"Handler {name} is not exposed: its category is not in {self.categories}")
+            else:
+                self._flag(f"Handler {name} has no schema in any category")
+
+        # Built once: the static payload is reused for every request and ends with the prompt cache breakpoint
+        self.payload = [tool.definition for tool in self.tools.values()]
+        if self.payload:
+            self.payload[-1] = {**self.payload[-1], "cache_control": {"type": "ephemeral"}}
+        logger.info(f"Loaded tools: {list(self.tools)}")
+
+    def get(self, name: str) -> Optional[RegisteredTool]:
+        return self.tools.get(name)
+
+    def _load_definitions(self) -> List[dict]:
+        definitions = []
+        for category in self.categories:
+            category_path = os.path.join(TOOLS_DEFINITION_PATH, category)
+            if not os.path.isdir(category_path):
+                self._flag(f"Category path not found: {category_path}")
+                continue
+
+            for filename in sorted(os.listdir(category_path)):
+                if not filename.endswith('.json'):
+                    continue
+                file_path = os.path.join(category_path, filename)
+                try:
+                    with open(file_path, 'r') as file:
+                        definition = json.load(file)
+                except (OSError, ValueError) as e:
+                    self._flag(f"Could not load tool definition {file_path}: {e}")
+                    continue
+                if definition.get('name') != filename[:-5]:
+                    self._flag(f"Tool {definition.get('name')} is defined in {file_path}, expected {filename[:-5]}")
+                    continue
+                definitions.append(definition)
+        return definitions
+
+    @staticmethod
+    def _defined_names() -> set:
+        """Tool names with a definition file in any category, enabled or not"""
+        names = set()
+        for category in os.listdir(TOOLS_DEFINITION_PATH):
+            category_path = os.path.join(TOOLS_DEFINITION_PATH, category)
+            if os.path.isdir(category_path):
+                names.update(filename[:-5] for filename in os.listdir(category_path) if filename.endswith('.json'))
+        return names
+
+    def _flag(self, message: str):
+        self.mismatches.append(message)
+        logger.error(message)
@@ -0,0 +1,43 @@
+from collections import defaultdict
+from typing import Dict
+
+from utils.logger import logger
+
+_USAGE_FIELDS = ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens", "output_tokens")
+
+
+class UsageTracker:
+    """Token and latency accounting for Claude requests, per chat and in total"""
+
+    def __init__(self):
+        self._per_chat: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._total: Dict[str, float] = defaultdict(float)
+
+    def record(self, chat_id: str, usage, latency: float, first_token_latency: float = None):
+        values = {field: getattr(usage, field, None) or 0 for field in _USAGE_FIELDS}
+        values["requests"] = 1
+        values["latency"] = latency
+        values["first_token_latency"] = first_token_latency if first_token_latency is not None else latency
+
+        for totals in (self._per_chat[chat_id], self._total):
+            for field, value in values.items():
+                totals[field] += value
+
+        prompt_tokens = values["input_tokens"] + values["cache_creation_input_tokens"] + values["cache_read_input_tokens"]
+        logger.info(
+            f"Claude request for chat {chat_id}: {prompt_tokens} prompt tokens "
+            f"({values['cache_read_input_tokens']} cached, {values['cache_creation_input_tokens']} written to cache), "
+            f"{values['output_tokens']} output tokens, first token after {values['first_token_latency'] * 1000:.0f} ms, "
+            f"{latency * 1000:.0f} ms total"
+        )
+
+    def get_stats(self, chat_id: str = None) -> Dict:
+        totals = self._total if chat_id is None else self._per_chat.get(chat_id, {})
+        requests = totals.get("requests", 0)
+        prompt_tokens = sum(totals.get(field, 0) for field in _USAGE_FIELDS[:3])
+        return {
+            **{field: int(totals.get(field, 0)) for field in (*_USAGE_FIELDS, "requests")},
+            "cache_hit_rate": totals.get("cache_read_input_tokens", 0) / prompt_tokens if prompt_tokens else 0.0,
+            "average_latency": totals.get("latency", 0) / requests if requests else 0.0,
+            "average_first_token_latency": totals.get("first_token_latency", 0) / requests if requests else 0.0
+        }
@@ -1,3 +1,5 @@
+import asyncio
+
 from telegram import Update
 from telegram.ext import ContextTypes, CallbackContext, ConversationHandler
 
@@ -17,11 +19,7 @@ def get_user_language(context):
 async def show_context(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = "Saved data:\n"
     for key, value in context.user_data.items():
-        # Check if value looks like hex data (starts with typical hex pattern)
-        if isinstance(value, str) and value.startswith('4944'):
-            message += f"#{key}: Binary Audio\n"
-        else:
-            message += f"{key}: {str(value)[:30]}\n"
+        message += f"{key}: {str(value)[:30]}\n"
 
     await update.message.reply_text(message)
 
@@ -43,14 +41,14 @@ async def list_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Please register first using /start")
         return
 
-    events = event_repo.check_what_we_have_today()
+    events = await asyncio.to_thread(event_repo.check_what_we_have_today, str(user.id))
     if not events:
         await update.message.reply_text("No events for today!")
         return
 
     message = "Today's events:\n"
     for event in events:
-        message += f"\n- {event.description} at {event.around} ({event.precision})"
+        message += f"\n- {event.description} at {event.around:%H:%M} ({event.precision.value})"
 
     await update.message.reply_text(message)
 
@@ -61,5 +59,5 @@ async def add_event(update: Update, context: ContextTypes.DEFAULT_TYPE, event: E
         await update.message.reply_text("Please register first using /start")
         return
 
-    event_id = event_repo.add_event(event)
+    await asyncio.to_thread(event_repo.add_event, event)
     await update.message.reply_text(f"Event added: {event.description} at {event.around}")
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+from telegram import Message
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from utils.logger import logger
+
+
+class ProgressiveReply:
+    """A single Telegram reply that is edited in place while its text is still being generated.
+
+    Edits are spaced at least min_interval apart; text arriving in between is
+    coalesced into the next edit.
+    """
+
+    def __init__(self, source: Message, min_interval: float = None):
+        self.source = source
+        self.min_interval = min_interval or float(os.getenv("TELEGRAM_EDIT_INTERVAL", 1.0))
+        self.message: Optional[Message] = None
+        self._text = ""
+        self._shown = ""
+        self._last_edit = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+        # A flush that has finished waiting and may be posting the first message right now
+        self._sending_task: Optional[asyncio.Task] = None
+        # Serializes sends so a late flush and finish() never both create the reply
+        self._send_lock = asyncio.Lock()
+
+    def update(self, text: str):
+        self._text = text
+        if self._flush_task is None:
+            delay = max(0.0, self._last_edit + self.min_interval - time.monotonic())
+            self._flush_task = asyncio.create_task(self._flush_later(delay))
+
+    async def finish(self, text: str):
+        # A flush still waiting for its turn is dropped; one already sending is awaited, since
+        # cancelling it mid-request could post the first message without us learning its id
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._sending_task is not None:
+            await asyncio.shield(self._sending_task)
+
+        limit = MessageLimit.MAX_TEXT_LENGTH
+        chunks = [text[start:start + limit] for start in range(0, len(text), limit)] or [""]
+        await self._show(chunks[0], final=True)
+        for chunk in chunks[1:]:
+            await self.source.reply_text(chunk)
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        self._sending_task = asyncio.current_task()
+        try:
+            # Only the start fits while streaming; finish() sends the rest
+            await self._show(self._text[:MessageLimit.MAX_TEXT_LENGTH])
+        finally:
+            if self._sending_task is asyncio.current_task():
+                self._sending_task = None
+
+    async def _show(self, text: str, final: bool = False):
+        async with self._send_lock:
+            await self._send(text, final)
+
+    async def _send(self, text: str, final: bool):
+        if not text.strip() or text == self._shown:
+            return
+
+        try:
+            if self.message is None:
+                self.message = await self.source.reply_text(text)
+            else:
+                await self.message.edit_text(text)
+            self._shown = text
+        except RetryAfter as e:
+            logger.warning(f"Telegram asked to slow down edits for {e.retry_after}s")
+            if final:
+                # The final text must get through; intermediate ones can simply be skipped
+                await asyncio.sleep(e.retry_after)
+                return await self._send(text, final)
+            self._last_edit = time.monotonic() + e.retry_after
+            return
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                logger.error(f"Could not update reply: {e}")
+        except TelegramError as e:
+            logger.error(f"Could not update reply: {e}")
+        self._last_edit = time.monotonic()
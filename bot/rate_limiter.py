@@ -0,0 +1,167 @@
+import asyncio
+import contextlib
+import itertools
+import os
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from utils.logger import logger
+
+# Lower lanes go first: short text replies and edits ahead of large uploads
+_ENDPOINT_LANES = {
+    "sendMessage": 0,
+    "editMessageText": 0,
+    "answerCallbackQuery": 0,
+    "sendChatAction": 0,
+    "sendPhoto": 1,
+    "sendAudio": 2,
+    "sendVoice": 2,
+    "sendDocument": 2,
+    "sendVideo": 2,
+}
+_DEFAULT_LANE = 1
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def wait_time(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.paused_until:
+            return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_idle(self) -> bool:
+        return self.wait_time() == 0 and self.tokens >= self.capacity
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Schedules outbound Bot API calls through token buckets, globally and per chat.
+
+    Waiting calls are released in priority lanes (text and edits before audio
+    uploads), falling back to lower lanes when the chats of higher ones are out of
+    tokens. A RetryAfter pauses the affected chat before the call is retried. Calls without a chat_id, such as getUpdates, are not limited.
+    """
+
+    def __init__(self, global_rate: float = None, chat_rate: float = None, chat_burst: float = None,
+                 group_rate: float = None, max_retries: int = None):
+        self.global_rate = global_rate or float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+        self.chat_rate = chat_rate or float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+        self.chat_burst = chat_burst or float(os.getenv("TELEGRAM_CHAT_BURST", 3))
+        self.group_rate = group_rate or float(os.getenv("TELEGRAM_GROUP_RATE", 20 / 60))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("TELEGRAM_MAX_RETRIES", 2))
+
+        self._global = _TokenBucket(self.global_rate, self.global_rate)
+        self._chats: Dict[Union[int, str], _TokenBucket] = {}
+        self._waiting: List[Tuple[int, int, Union[int, str], asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.stats = {"sent": 0, "retries": 0}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._dispatcher
+            self._dispatcher = None
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+
+        max_retries = rate_limit_args if rate_limit_args is not None else self.max_retries
+        for attempt in range(max_retries + 1):
+            await self._wait_turn(chat_id, _ENDPOINT_LANES.get(endpoint, _DEFAULT_LANE))
+            try:
+                self.stats["sent"] += 1
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == max_retries:
+                    raise
+                self.stats["retries"] += 1
+                logger.info(f"Telegram rate limit hit for chat {chat_id} on {endpoint}, pausing {e.retry_after}s")
+                self._chat_bucket(chat_id).paused_until = time.monotonic() + e.retry_after
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> _TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 1024:
+                for idle_chat in [key for key, value in self._chats.items() if value.is_idle()]:
+                    del self._chats[idle_chat]
+            is_group = isinstance(chat_id, str) or int(chat_id) < 0
+            bucket = _TokenBucket(self.group_rate, self.chat_burst) if is_group else _TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _wait_turn(self, chat_id: Union[int, str], lane: int):
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((lane, next(self._sequence), chat_id, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self):
+        while True:
+            delay = self._release_ready()
+            self._wakeup.clear()
+            if not self._waiting:
+                await self._wakeup.wait()
+                continue
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+
+    def _release_ready(self) -> float:
+        """Release every waiting call that has tokens and return how long until the next one could"""
+        while self._waiting:
+            global_wait = self._global.wait_time()
+            if global_wait > 0:
+                return global_wait
+
+            next_wait = float("inf")
+            for entry in sorted(self._waiting, key=lambda waiting: waiting[:2]):
+                _, _, chat_id, future = entry
+                if future.done():
+                    # Cancelled while waiting: leave without spending tokens
+                    self._waiting.remove(entry)
+                    break
+                chat_bucket = self._chat_bucket(chat_id)
+                chat_wait = chat_bucket.wait_time()
+                if chat_wait == 0:
+                    chat_bucket.take()
+                    self._global.take()
+                    self._waiting.remove(entry)
+                    future.set_result(None)
+                    break
+                next_wait = min(next_wait, chat_wait)
+            else:
+                return next_wait
+        return 0.0
+
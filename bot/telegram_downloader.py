@@ -0,0 +1,147 @@
+import asyncio
+import os
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from telegram import Bot
+from telegram.error import TelegramError
+
+from services.track_downloader import DownloadResult, TrackDownloader
+from utils.logger import logger
+
+load_dotenv()
+
+
+class TelegramFileDownloader:
+    """Downloads files sent to the bot once per file_unique_id.
+
+    file_unique_id is the same for every forward of a file, across chats and bots,
+    so a track forwarded again is served from disk without calling getFile.
+    Concurrent requests for the same file share one getFile call and one download,
+    which is streamed to disk in chunks.
+    """
+
+    def __init__(self, downloader: TrackDownloader = None):
+        self.downloader = downloader or TrackDownloader(
+            download_dir=os.getenv("TELEGRAM_DOWNLOAD_DIR", os.path.join(".cache", "telegram_files")),
+            disk_budget=int(os.getenv("TELEGRAM_DOWNLOAD_DISK_BUDGET", 1024 * 1024 * 1024))
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = {"downloads": 0, "cache_hits": 0, "coalesced": 0, "downloaded_bytes": 0, "saved_bytes": 0}
+
+    async def fetch(self, bot: Bot, file_id: str, file_unique_id: str) -> Optional[DownloadResult]:
+        cached = await self.downloader.get_cached(file_unique_id)
+        if cached:
+            self._stats["cache_hits"] += 1
+            self._stats["saved_bytes"] += cached.size
+            return cached
+
+        task = self._inflight.get(file_unique_id)
+        if task is None:
+            task = asyncio.ensure_future(self._download(bot, file_id, file_unique_id))
+            self._inflight[file_unique_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(file_unique_id, None))
+            return await asyncio.shield(task)
+
+        self._stats["coalesced"] += 1
+        result = await asyncio.shield(task)
+        if result:
+            self._stats["saved_bytes"] += result.size
+        return result
+
+    async def _download(self, bot: Bot, file_id: str, file_unique_id: str) -> Optional[DownloadResult]:
+        try:
+            file = await bot.get_file(file_id)
+        except TelegramError as e:
+            logger.error(f"Could not resolve Telegram file {file_unique_id}: {e}")
+            return None
+
+        result = await self.downloader.download(file.file_path, file_unique_id)
+        if result:
+            self._stats["downloads"] += 1
+            self._stats["downloaded_bytes"] += result.size
+        return result
+
+    def get_stats(self) -> dict:
+        return dict(self._stats)
+
+
+if __name__ == "__main__":
+    import json
+    import random
+    import shutil
+    import tempfile
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs
+
+    from telegram.ext import ExtBot
+
+    # Replay benchmark against a local Bot API stub: 300 audio messages in bursts of 10, drawn from 30
+    # distinct 4 MB tracks with a skewed popularity, like songs forwarded around between chats
+    tracks = {f"track{i}": os.urandom(4 * 1024 * 1024) for i in range(30)}
+    rng = random.Random(1)
+    messages = rng.choices(list(tracks), weights=[1 / (rank + 1) for rank in range(len(tracks))], k=300)
+
+    class StubBotApi(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        served = {"bytes": 0, "get_file": 0}
+
+        def do_POST(self):
+            body = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+            if self.path.endswith("/getMe"):
+                result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench"}
+            else:
+                self.served["get_file"] += 1
+                unique_id = body["file_id"][0].split("-", 1)[1]
+                result = {"file_id": body["file_id"][0], "file_unique_id": unique_id,
+                          "file_size": len(tracks[unique_id]), "file_path": f"music/{unique_id}.mp3"}
+            self._reply(json.dumps({"ok": True, "result": result}).encode())
+
+        def do_GET(self):
+            data = tracks[self.path.rsplit("/", 1)[-1][:-4]]
+            self.served["bytes"] += len(data)
+            self._reply(data)
+
+        def _reply(self, payload: bytes):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubBotApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    address = f"http://127.0.0.1:{server.server_port}"
+
+    async def replay(handle_message):
+        StubBotApi.served.update({"bytes": 0, "get_file": 0})
+        async with ExtBot("1:bench", base_url=f"{address}/bot", base_file_url=f"{address}/file/bot") as bot:
+            started = time.perf_counter()
+            for burst in range(0, len(messages), 10):
+                await asyncio.gather(*(handle_message(bot, unique_id) for unique_id in messages[burst:burst + 10]))
+            elapsed = time.perf_counter() - started
+        return (f"{elapsed:.2f}s, {StubBotApi.served['get_file']} getFile calls, "
+                f"{StubBotApi.served['bytes'] / 1024 / 1024:.0f} MB downloaded")
+
+    async def download_every_time(bot, unique_id):
+        file = await bot.get_file(f"fid-{unique_id}")
+        await file.download_as_bytearray()
+
+    async def main():
+        print(f"{len(messages)} messages, {len(set(messages))} distinct tracks, "
+              f"{sum(len(tracks[unique_id]) for unique_id in messages) / 1024 / 1024:.0f} MB in total")
+        print(f"getFile + download every time: {await replay(download_every_time)}")
+
+        download_dir = tempfile.mkdtemp(prefix="kneo_telegram_bench_")
+        downloader = TelegramFileDownloader(TrackDownloader(download_dir=download_dir))
+        print(f"Deduplicated by file_unique_id: "
+              f"{await replay(lambda bot, unique_id: downloader.fetch(bot, f'fid-{unique_id}', unique_id))}")
+        print(f"Downloader stats: {downloader.get_stats()}")
+        shutil.rmtree(download_dir, ignore_errors=True)
+
+    asyncio.run(main())
+    server.shutdown()
@@ -0,0 +1,121 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Dict, Hashable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from utils.logger import logger
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates of different chats concurrently and updates of one chat in arrival order.
+
+    PTB bounds how many updates may be pending (max_pending_updates); a separate
+    limit applies to updates actually running, and an update only takes a running
+    slot once the previous update of its chat has finished, so one busy chat
+    cannot occupy all workers.
+    """
+
+    def __init__(self, max_concurrent_updates: int = None, max_pending_updates: int = None):
+        max_concurrent_updates = max_concurrent_updates or int(os.getenv("BOT_CONCURRENT_UPDATES", 16))
+        super().__init__(max_pending_updates or int(os.getenv("BOT_MAX_PENDING_UPDATES", 1024)))
+        self._running = asyncio.Semaphore(max_concurrent_updates)
+        self._chat_tails: Dict[Hashable, asyncio.Future] = {}
+
+    @staticmethod
+    def get_chat_key(update: object) -> Hashable:
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        chat_key = self.get_chat_key(update)
+        if chat_key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        previous = self._chat_tails.get(chat_key)
+        done = asyncio.get_running_loop().create_future()
+        self._chat_tails[chat_key] = done
+        try:
+            if previous is not None:
+                await previous
+            async with self._running:
+                await coroutine
+        except asyncio.CancelledError:
+            coroutine.close()
+            raise
+        finally:
+            done.set_result(None)
+            if self._chat_tails.get(chat_key) is done:
+                del self._chat_tails[chat_key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._chat_tails:
+            logger.info(f"Update processor shutting down with {len(self._chat_tails)} chats still busy")
+
+
+if __name__ == "__main__":
+    import json
+    import random
+    import sys
+    import time
+    from types import SimpleNamespace
+
+    from telegram.ext import SimpleUpdateProcessor
+
+    # Replay benchmark: recorded updates (JSON lines, argv[1]) or 2,000 synthetic ones over 200 chats,
+    # each handled by a simulated 20-200 ms AI/audio call
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as file:
+            chat_ids = [
+                PerChatUpdateProcessor.get_chat_key(Update.de_json(json.loads(line), None))
+                for line in file if line.strip()
+            ]
+    else:
+        rng = random.Random(1)
+        chat_ids = [rng.randrange(200) for _ in range(2000)]
+    updates = [SimpleNamespace(chat_id=chat_id, seq=seq) for seq, chat_id in enumerate(chat_ids)]
+    durations = [random.Random(seq).uniform(0.02, 0.2) for seq in range(len(updates))]
+
+    class ReplayProcessor(PerChatUpdateProcessor):
+        @staticmethod
+        def get_chat_key(update):
+            return update.chat_id
+
+    async def replay(processor, arrival_interval):
+        latencies, order = [], {}
+
+        async def handle(update, arrived):
+            await asyncio.sleep(durations[update.seq])
+            latencies.append(time.perf_counter() - arrived)
+            order.setdefault(update.chat_id, []).append(update.seq)
+
+        started = time.perf_counter()
+        tasks = []
+        async with processor:
+            for update in updates:
+                arrived = time.perf_counter()
+                tasks.append(asyncio.create_task(processor.process_update(update, handle(update, arrived))))
+                await asyncio.sleep(arrival_interval)
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        in_order = all(seqs == sorted(seqs) for seqs in order.values())
+        latencies.sort()
+        return (f"{len(updates) / elapsed:.0f} updates/s, p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.0f} ms, per-chat order kept: {in_order}")
+
+    async def main():
+        print(f"Replaying {len(updates)} updates from {len(set(chat_ids))} chats")
+        print(f"Sequential (PTB default): would take {sum(durations):.1f}s, {len(updates) / sum(durations):.0f} updates/s")
+        print(f"Unordered, 16 workers:             {await replay(SimpleUpdateProcessor(16), 0.001)}")
+        print(f"Per-chat ordered, 16 workers:      {await replay(ReplayProcessor(16), 0.001)}")
+        print(f"Per-chat ordered, 64 workers:      {await replay(ReplayProcessor(64), 0.001)}")
+
+    asyncio.run(main())
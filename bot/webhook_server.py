@@ -0,0 +1,180 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+from typing import Callable, Optional
+
+from aiohttp import web
+from dotenv import load_dotenv
+from telegram import Bot, Update
+from telegram.ext import Application
+
+from utils.logger import logger
+
+load_dotenv()
+
+
+def get_update_chat_id(data: dict) -> Optional[int]:
+    """Find the chat of a raw update without building telegram objects"""
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat.get("id")
+        sender = value.get("from")
+        if sender:
+            return sender.get("id")
+    return None
+
+
+def _run_worker(application_factory: Callable[[], Application], updates: multiprocessing.Queue, index: int):
+    # Shutdown is driven by the front process through the queue
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Lets the application run process-wide background jobs in one worker only
+    os.environ["BOT_WORKER_INDEX"] = str(index)
+    asyncio.run(_serve_worker(application_factory, updates))
+
+
+async def _serve_worker(application_factory: Callable[[], Application], updates: multiprocessing.Queue):
+    application = application_factory()
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        loop = asyncio.get_running_loop()
+        while True:
+            data = await loop.run_in_executor(None, updates.get)
+            if data is None:
+                break
+            try:
+                update = Update.de_json(data, application.bot)
+            except Exception as e:
+                logger.warning(f"Dropping malformed update {data.get('update_id')}: {e!r}")
+                continue
+            await application.update_queue.put(update)
+        await application.stop()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+class WebhookServer:
+    """Receives Telegram webhook calls and hands the updates to the application.
+
+    With one worker, updates go straight into the application's update queue. With
+    more, every worker process runs its own application and chats are sharded
+    across them by chat id, so a chat always lands on the same worker and keeps
+    its conversation state there. Each worker finds its index in BOT_WORKER_INDEX.
+
+    The server refuses to start without a secret token, since anyone who can reach
+    it could otherwise post fake updates.
+    """
+
+    def __init__(self, application_factory: Callable[[], Application], token: str, workers: int = None,
+                 listen: str = None, port: int = None, url_path: str = None, webhook_url: str = None,
+                 secret_token: str = None):
+        self.application_factory = application_factory
+        self.token = token
+        self.workers = workers or int(os.getenv("BOT_WORKERS", 1))
+        self.listen = listen or os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+        self.port = port or int(os.getenv("WEBHOOK_PORT", 8443))
+        self.url_path = (url_path or os.getenv("WEBHOOK_PATH", "telegram")).strip("/")
+        self.webhook_url = webhook_url or os.getenv("WEBHOOK_URL")
+        self.secret_token = secret_token or os.getenv("WEBHOOK_SECRET")
+        self.worker_queue_size = int(os.getenv("BOT_WORKER_QUEUE_SIZE", 1000))
+        self._dispatch = None
+        self._stop = None
+
+    async def run(self):
+        if not self.secret_token:
+            raise RuntimeError("WEBHOOK_SECRET is not configured")
+        self._stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for stop_signal in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(stop_signal, self._stop.set)
+
+        if self.workers == 1:
+            await self._run_single()
+        else:
+            await self._run_sharded()
+
+    def stop(self):
+        self._stop.set()
+
+    async def _run_single(self):
+        application = self.application_factory()
+        async with application:
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+            self._dispatch = lambda data: application.update_queue.put_nowait(Update.de_json(data, application.bot))
+            await self._serve(application.bot)
+            await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+    async def _run_sharded(self):
+        context = multiprocessing.get_context("spawn")
+        queues = [context.Queue(self.worker_queue_size) for _ in range(self.workers)]
+        processes = [
+            context.Process(target=_run_worker, args=(self.application_factory, updates, index), daemon=True)
+            for index, updates in enumerate(queues)
+        ]
+        for process in processes:
+            process.start()
+        logger.info(f"Started {self.workers} update workers")
+
+        def dispatch(data: dict):
+            chat_id = get_update_chat_id(data)
+            shard = (chat_id if chat_id is not None else data.get("update_id", 0)) % self.workers
+            queues[shard].put_nowait(data)
+
+        self._dispatch = dispatch
+        try:
+            async with Bot(self.token, base_url=os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")) as bot:
+                await self._serve(bot)
+        finally:
+            for updates in queues:
+                updates.put(None)
+            await asyncio.to_thread(lambda: [process.join() for process in processes])
+
+    async def _serve(self, bot: Bot):
+        app = web.Application()
+        app.router.add_post(f"/{self.url_path}", self._handle_update)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, self.listen, self.port).start()
+        logger.info(f"Webhook server listening on {self.listen}:{self.port}/{self.url_path}")
+
+        try:
+            if self.webhook_url:
+                await bot.set_webhook(
+                    url=self.webhook_url,
+                    secret_token=self.secret_token,
+                    allowed_updates=Update.ALL_TYPES
+                )
+            await self._stop.wait()
+        finally:
+            await runner.cleanup()
+
+    async def _handle_update(self, request: web.Request) -> web.Response:
+        if self.secret_token and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != self.secret_token:
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(data, dict):
+            return web.Response(status=400)
+
+        try:
+            self._dispatch(data)
+        except queue.Full:
+            # Telegram retries the update later
+            logger.warning("Update workers are saturated, rejecting webhook call")
+            return web.Response(status=503)
+        except Exception as e:
+            # Acknowledged so Telegram does not redeliver an update that can never be parsed
+            logger.warning(f"Dropping malformed update {data.get('update_id')}: {e!r}")
+        return web.Response()
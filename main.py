@@ -1,10 +1,14 @@
+import asyncio
 import os
 from dotenv import load_dotenv
 from telegram import Update
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, CallbackContext
+from telegram.ext import Application, ApplicationBuilder, CommandHandler, MessageHandler, filters, CallbackContext
 
 from ai.assistant import Assistant
 from bot.command__handler import list_events, show_context
+from bot.rate_limiter import PriorityRateLimiter
+from bot.update_processor import PerChatUpdateProcessor
+from bot.webhook_server import WebhookServer
 from utils.logger import logger
 
 load_dotenv()
@@ -26,14 +30,24 @@ async def error_handler(update: object, context: CallbackContext):
         await update.message.reply_text("An error occurred. Please try again.")
 
 
-if __name__ == '__main__':
-    logger.info("Starting the bot...")
+def build_application() -> Application:
+    ai_handler = Assistant()
 
-    app = ApplicationBuilder().token(API_TOKEN).build()
+    # Slow AI updates of one chat run alongside other chats, while each chat's updates stay in order;
+    # outgoing calls are paced per chat so replies go out ahead of audio uploads instead of hitting 429s
+    builder = (
+        ApplicationBuilder()
+        .token(API_TOKEN)
+        .concurrent_updates(PerChatUpdateProcessor())
+        .rate_limiter(PriorityRateLimiter())
+        .post_init(ai_handler.start)
+        .post_shutdown(ai_handler.close)
+    )
+    if os.getenv("TELEGRAM_BASE_URL"):
+        builder = builder.base_url(os.getenv("TELEGRAM_BASE_URL"))
+    app = builder.build()
     app.add_error_handler(error_handler)
 
-    ai_handler = Assistant()
-
     app.add_handler(CommandHandler('show_context', show_context))
     app.add_handler(CommandHandler('events', list_events))
     app.add_handler(CommandHandler('set_language', set_language))
@@ -43,6 +57,15 @@ if __name__ == '__main__':
         (filters.TEXT | filters.AUDIO) & ~filters.COMMAND,
         ai_handler.handle_text
     ))
+    return app
 
-    logger.info("Bot is running...")
-    app.run_polling()
+
+if __name__ == '__main__':
+    logger.info("Starting the bot...")
+
+    if os.getenv("BOT_MODE", "polling") == "webhook":
+        logger.info("Bot is running in webhook mode...")
+        asyncio.run(WebhookServer(build_application, API_TOKEN).run())
+    else:
+        logger.info("Bot is running...")
+        build_application().run_polling()
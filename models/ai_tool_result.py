@@ -37,15 +37,18 @@ class AiToolResult:
         })
 
     @staticmethod
-    def from_audio(audio_data: bytes, text_message: str = None) -> 'AiToolResult':
+    def from_audio(audio_ref: str, size_bytes: int, text_message: str = None, details: dict = None) -> 'AiToolResult':
+        # Audio itself stays in the audio store; Claude only sees the reference and a summary
         return AiToolResult(True, {
-            "audio_data": audio_data.hex() if audio_data else None,
+            **(details or {}),
+            "audio_ref": audio_ref,
+            "size_bytes": size_bytes,
             "text": text_message or "Audio generated successfully"
         })
 
-    def get_audio_bytes(self) -> bytes:
-        if self.success and isinstance(self.data, dict) and "audio_data" in self.data:
-            return bytes.fromhex(self.data["audio_data"])
+    def get_audio_ref(self) -> str:
+        if self.success and isinstance(self.data, dict):
+            return self.data.get("audio_ref")
         return None
 
     def get_telegram_answer(self) -> str:
@@ -62,14 +65,18 @@ class AiToolResult:
 
         return "Operation completed"
 
+    def get_claude_tool_result_block(self, tool_use_id: str) -> dict:
+        return {
+            "type": "tool_result",
+            "tool_use_id": tool_use_id,
+            "content": self.to_json(),
+            "is_error": not self.success
+        }
+
     def get_claude_tool_result(self, tool_use_id: str) -> dict:
         return {
             "role": "user",
-            "content": [{
-                "type": "tool_result",
-                "tool_use_id": tool_use_id,
-                "content": self.to_json()
-            }]
+            "content": [self.get_claude_tool_result_block(tool_use_id)]
         }
 
     def get_claude_messages(self, tool_use_id: str, response_content: list) -> list:
@@ -77,3 +84,14 @@ class AiToolResult:
             {"role": "assistant", "content": response_content},
             self.get_claude_tool_result(tool_use_id)
         ]
+
+    @staticmethod
+    def get_claude_turn_messages(response_content: list, tool_results: list) -> list:
+        """Build the assistant turn and a single user turn answering every (tool_use_id, result) pair"""
+        return [
+            {"role": "assistant", "content": response_content},
+            {
+                "role": "user",
+                "content": [result.get_claude_tool_result_block(tool_use_id) for tool_use_id, result in tool_results]
+            }
+        ]
@@ -1,11 +1,15 @@
+import asyncio
 import json
 import os
 import logging
-import requests
+import time
+import httpx
 from dotenv import load_dotenv
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 from dataclasses import dataclass
 
+from services.http_client import CircuitOpenError, get_http_client
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
@@ -38,7 +42,21 @@ class Track:
         )
 
 
+class _PendingAdds:
+    def __init__(self):
+        self.tracks: List[Track] = []
+        self.future = asyncio.get_running_loop().create_future()
+
+
 class MusicAPIClient:
+    """Async client for the music player API.
+
+    The batch calls use queue/add-batch, queue/remove-batch and favorites/add-batch.
+    The player API does not document them yet, so they are only sent when
+    MUSIC_API_BATCH_ENDPOINTS is enabled; otherwise the batch methods fall back to
+    one single-item request per track or index, in order.
+    """
+
     def __init__(self):
         self.jwt_token = os.getenv('JWT_TOKEN')
         self.api_base_url = os.getenv('API_BASE_URL')
@@ -47,18 +65,31 @@ class MusicAPIClient:
             'Authorization': f'Bearer {self.jwt_token}',
             'Content-Type': 'application/json'
         }
+        self.batch_endpoints = os.getenv('MUSIC_API_BATCH_ENDPOINTS', 'false').lower() in ('1', 'true', 'yes')
+        self.max_batch_size = int(os.getenv('MUSIC_API_MAX_BATCH_SIZE', 100))
+        # Adds for a chat that arrive while its previous add is in flight are sent together once it completes
+        self._pending_adds: Dict[str, _PendingAdds] = {}
+        self._sending_adds: Dict[str, asyncio.Task] = {}
+        # Player state reads are cached per chat and dropped by our own mutating calls
+        self.state_ttl = float(os.getenv('MUSIC_API_STATE_TTL', 2))
+        self.push_ttl = float(os.getenv('MUSIC_API_PUSH_TTL', 30))
+        self.state_prune_interval = float(os.getenv('MUSIC_API_STATE_PRUNE_INTERVAL', 60))
+        self._state_cache: Dict[Tuple[str, str], Tuple[float, Dict]] = {}
+        self._state_inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._state_generation: Dict[str, int] = {}
+        self._state_pruned_at = time.monotonic()
 
-    def _make_request(self, method: str, endpoint: str, payload: Dict = None) -> Optional[Dict]:
+    async def _make_request(self, method: str, endpoint: str, payload: Dict = None,
+                            idempotent: bool = None) -> Optional[Dict]:
         """Make HTTP request to the API with error handling"""
         try:
             url = f"{self.api_base_url}/api/{self.app_name}/music/{endpoint}"
-            logger.info(f"Making {method} request to: {url}")
-            if payload:
-                logger.info(f"Request payload: {json.dumps(payload, indent=2)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"{method} {url} payload: {json.dumps(payload)[:500] if payload else None}")
 
-            response = requests.request(method, url, headers=self.headers, json=payload)
-            logger.info(f"Response status code: {response.status_code}")
-            logger.info(f"Response content: {response.text}")
+            response = await get_http_client().request(method, url, idempotent=idempotent, headers=self.headers,
+                                                        json=payload)
+            logger.debug(f"{method} {endpoint} returned {response.status_code}")
 
             if response.status_code in (200, 201):
                 return response.json()
@@ -66,82 +97,143 @@ class MusicAPIClient:
                 logger.error(f"Error: {response.status_code}, Response: {response.text}")
                 return None
 
-        except requests.RequestException as e:
+        except (httpx.HTTPError, CircuitOpenError) as e:
             logger.error(f"Request error: {e}")
             return None
 
-    def get_queue(self, chat_id: str) -> List[Track]:
+    async def get_queue(self, chat_id: str) -> List[Track]:
         """Get the current music queue for a chat"""
-        response = self._make_request('GET', f'queue/{chat_id}')
+        response = await self._get_state(chat_id, 'queue', f'queue/{chat_id}')
         if response and 'payload' in response:
             return [Track.from_dict(track) for track in response['payload'].get('queue', [])]
         return []
 
-    def add_to_queue(self, chat_id: str, track: Track) -> Optional[Dict]:
-        """Add a track to the queue"""
+    async def add_to_queue(self, chat_id: str, track: Track) -> Optional[Dict]:
+        """Add a track to the queue, coalesced with concurrent adds for the same chat"""
+        if not self.batch_endpoints:
+            return await self._add_one(chat_id, track)
+
+        pending = self._pending_adds.get(chat_id)
+        if pending is None:
+            pending = _PendingAdds()
+            self._pending_adds[chat_id] = pending
+        pending.tracks.append(track)
+        # Nothing in flight for this chat: send right away, without waiting for other adds
+        if chat_id not in self._sending_adds:
+            self._start_sending_adds(chat_id)
+        return await asyncio.shield(pending.future)
+
+    async def add_many_to_queue(self, chat_id: str, tracks: List[Track]) -> Optional[Dict]:
+        """Add several tracks to the queue, in one request per MUSIC_API_MAX_BATCH_SIZE tracks with batch endpoints"""
+        if not self.batch_endpoints:
+            return await self._each_in_order([lambda track=track: self._add_one(chat_id, track) for track in tracks])
+
+        async def add_batch(batch: List[Track]) -> Optional[Dict]:
+            if len(batch) == 1:
+                return await self._add_one(chat_id, batch[0])
+            payload = {
+                "chatId": chat_id,
+                "tracks": [track.to_dict() for track in batch]
+            }
+            return await self._mutate(chat_id, ('queue', 'status'), 'POST', 'queue/add-batch', payload)
+
+        return await self._each_in_order([
+            lambda start=start: add_batch(tracks[start:start + self.max_batch_size])
+            for start in range(0, len(tracks), self.max_batch_size)
+        ])
+
+    async def _add_one(self, chat_id: str, track: Track) -> Optional[Dict]:
         payload = {
             "chatId": chat_id,
             "track": track.to_dict()
         }
-        return self._make_request('POST', 'queue/add', payload)
+        return await self._mutate(chat_id, ('queue', 'status'), 'POST', 'queue/add', payload)
 
-    def remove_from_queue(self, chat_id: str, track_index: int) -> Optional[Dict]:
+    async def remove_from_queue(self, chat_id: str, track_index: int) -> Optional[Dict]:
         """Remove a track from the queue by index"""
         payload = {
             "chatId": chat_id,
             "index": track_index
         }
-        return self._make_request('DELETE', 'queue/remove', payload)
+        # Removal by index is not idempotent: repeating it after a timeout would remove the next track
+        return await self._mutate(chat_id, ('queue', 'status'), 'DELETE', 'queue/remove', payload, idempotent=False)
 
-    def clear_queue(self, chat_id: str) -> Optional[Dict]:
+    async def remove_many_from_queue(self, chat_id: str, track_indices: List[int]) -> Optional[Dict]:
+        """Remove several tracks from the queue by index, in one request with batch endpoints"""
+        # Highest first, so removing one never shifts the indices still to be removed
+        indices = sorted(set(track_indices), reverse=True)
+        if not self.batch_endpoints:
+            return await self._each_in_order([
+                lambda index=index: self.remove_from_queue(chat_id, index) for index in indices
+            ])
+
+        payload = {
+            "chatId": chat_id,
+            "indices": indices
+        }
+        return await self._mutate(chat_id, ('queue', 'status'), 'DELETE', 'queue/remove-batch', payload,
+                                  idempotent=False)
+
+    async def clear_queue(self, chat_id: str) -> Optional[Dict]:
         """Clear the entire queue for a chat"""
-        return self._make_request('DELETE', f'queue/{chat_id}')
+        return await self._mutate(chat_id, ('queue', 'status'), 'DELETE', f'queue/{chat_id}')
 
-    def skip_current(self, chat_id: str) -> Optional[Dict]:
+    async def skip_current(self, chat_id: str) -> Optional[Dict]:
         """Skip the currently playing track"""
-        return self._make_request('POST', f'player/{chat_id}/skip')
+        return await self._mutate(chat_id, ('queue', 'current', 'status'), 'POST', f'player/{chat_id}/skip')
 
-    def pause(self, chat_id: str) -> Optional[Dict]:
+    async def pause(self, chat_id: str) -> Optional[Dict]:
         """Pause the current playback"""
-        return self._make_request('POST', f'player/{chat_id}/pause')
+        return await self._mutate(chat_id, ('status',), 'POST', f'player/{chat_id}/pause')
 
-    def resume(self, chat_id: str) -> Optional[Dict]:
+    async def resume(self, chat_id: str) -> Optional[Dict]:
         """Resume the current playback"""
-        return self._make_request('POST', f'player/{chat_id}/resume')
+        return await self._mutate(chat_id, ('status',), 'POST', f'player/{chat_id}/resume')
 
-    def get_current_track(self, chat_id: str) -> Optional[Track]:
+    async def get_current_track(self, chat_id: str) -> Optional[Track]:
         """Get information about the currently playing track"""
-        response = self._make_request('GET', f'player/{chat_id}/current')
+        response = await self._get_state(chat_id, 'current', f'player/{chat_id}/current')
         if response and 'payload' in response and 'currentTrack' in response['payload']:
             return Track.from_dict(response['payload']['currentTrack'])
         return None
 
-    def save_favorite(self, user_id: str, track: Track) -> Optional[Dict]:
+    async def save_favorite(self, user_id: str, track: Track) -> Optional[Dict]:
         """Save a track to user's favorites"""
         payload = {
             "userId": user_id,
             "track": track.to_dict()
         }
-        return self._make_request('POST', 'favorites/add', payload)
+        return await self._make_request('POST', 'favorites/add', payload)
+
+    async def save_favorites(self, user_id: str, tracks: List[Track]) -> Optional[Dict]:
+        """Save several tracks to user's favorites, in one request with batch endpoints"""
+        if not self.batch_endpoints:
+            return await self._each_in_order([lambda track=track: self.save_favorite(user_id, track) for track in tracks])
+
+        payload = {
+            "userId": user_id,
+            "tracks": [track.to_dict() for track in tracks]
+        }
+        return await self._make_request('POST', 'favorites/add-batch', payload)
 
-    def get_favorites(self, user_id: str) -> List[Track]:
+    async def get_favorites(self, user_id: str) -> List[Track]:
         """Get user's favorite tracks"""
-        response = self._make_request('GET', f'favorites/{user_id}')
+        response = await self._make_request('GET', f'favorites/{user_id}')
         if response and 'payload' in response:
             return [Track.from_dict(track) for track in response['payload'].get('favorites', [])]
         return []
 
-    def remove_favorite(self, user_id: str, track_id: str) -> Optional[Dict]:
+    async def remove_favorite(self, user_id: str, track_id: str) -> Optional[Dict]:
         """Remove a track from user's favorites"""
         payload = {
             "userId": user_id,
             "trackId": track_id
         }
-        return self._make_request('DELETE', 'favorites/remove', payload)
+        return await self._make_request('DELETE', 'favorites/remove', payload)
 
-    def get_player_status(self, chat_id: str) -> Dict:
+    async def get_player_status(self, chat_id: str) -> Dict:
         """Get the current status of the music player"""
-        response = self._make_request('GET', f'player/{chat_id}/status')
+        response = await self._get_state(chat_id, 'status', f'player/{chat_id}/status')
         if response and 'payload' in response:
             return response['payload']
         return {
@@ -151,34 +243,191 @@ class MusicAPIClient:
             'volume': 0
         }
 
+    def apply_push_update(self, chat_id: str, status: Dict = None, current_track: Dict = None,
+                          queue: List[Dict] = None):
+        """Store player state pushed by the backend so reads skip the round-trip"""
+        self._state_generation[chat_id] = self._state_generation.get(chat_id, 0) + 1
+        expires_at = time.monotonic() + self.push_ttl
+        updates = {
+            'status': status,
+            'current': {'currentTrack': current_track} if current_track is not None else None,
+            'queue': {'queue': queue} if queue is not None else None
+        }
+        for kind, payload in updates.items():
+            if payload is not None:
+                self._state_cache[(chat_id, kind)] = (expires_at, {'payload': payload})
+
+    async def _get_state(self, chat_id: str, kind: str, endpoint: str) -> Optional[Dict]:
+        key = (chat_id, kind)
+        now = time.monotonic()
+        cached = self._state_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        if now - self._state_pruned_at > self.state_prune_interval:
+            self._prune_state(now)
+
+        # The read belongs to the client, so one cancelled caller does not cancel it for the others
+        task = self._state_inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._read_state(key, endpoint))
+            self._state_inflight[key] = task
+            task.add_done_callback(lambda _: self._state_inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _read_state(self, key: Tuple[str, str], endpoint: str) -> Optional[Dict]:
+        chat_id = key[0]
+        generation = self._state_generation.get(chat_id, 0)
+        response = await self._make_request('GET', endpoint)
+        # A mutation that started meanwhile may have made this response stale
+        if response is not None and self._state_generation.get(chat_id, 0) == generation:
+            self._state_cache[key] = (time.monotonic() + self.state_ttl, response)
+        return response
+
+    def _prune_state(self, now: float):
+        """Drop expired entries and the generations of chats with nothing cached or in flight"""
+        self._state_pruned_at = now
+        for key in [key for key, (expires_at, _) in self._state_cache.items() if expires_at <= now]:
+            del self._state_cache[key]
+        active_chats = {chat_id for chat_id, _ in self._state_cache} | {chat_id for chat_id, _ in self._state_inflight}
+        for chat_id in self._state_generation.keys() - active_chats:
+            del self._state_generation[chat_id]
+
+    async def _mutate(self, chat_id: str, kinds: Tuple[str, ...], method: str, endpoint: str,
+                      payload: Dict = None, idempotent: bool = None) -> Optional[Dict]:
+        self._invalidate(chat_id, kinds)
+        try:
+            return await self._make_request(method, endpoint, payload, idempotent)
+        finally:
+            self._invalidate(chat_id, kinds)
+
+    def _invalidate(self, chat_id: str, kinds: Tuple[str, ...]):
+        now = time.monotonic()
+        if now - self._state_pruned_at > self.state_prune_interval:
+            self._prune_state(now)
+        self._state_generation[chat_id] = self._state_generation.get(chat_id, 0) + 1
+        for kind in kinds:
+            self._state_cache.pop((chat_id, kind), None)
+
+    @staticmethod
+    async def _each_in_order(calls: List) -> Optional[Dict]:
+        """Run the calls one after another; the last response, or None as soon as one fails"""
+        response = None
+        for call in calls:
+            response = await call()
+            if response is None:
+                return None
+        return response
+
+    def _start_sending_adds(self, chat_id: str):
+        # The task is referenced until it completes; it then sends whatever was queued meanwhile
+        task = asyncio.ensure_future(self._send_adds(chat_id))
+        self._sending_adds[chat_id] = task
+
+        def on_done(_):
+            del self._sending_adds[chat_id]
+            if chat_id in self._pending_adds:
+                self._start_sending_adds(chat_id)
+        task.add_done_callback(on_done)
+
+    async def _send_adds(self, chat_id: str):
+        # Taken when the task starts, so adds made in the same loop iteration share the request
+        pending = self._pending_adds.pop(chat_id)
+        try:
+            pending.future.set_result(await self.add_many_to_queue(chat_id, pending.tracks))
+        except asyncio.CancelledError:
+            pending.future.cancel()
+            raise
+        except Exception as e:
+            pending.future.set_exception(e)
+
 
 # Example usage
 if __name__ == "__main__":
-    # Initialize the client
-    music_client = MusicAPIClient()
-
-    # Example track
-    track = Track(
-        title="Example Song",
-        artist="Example Artist",
-        url="https://example.com/song.mp3",
-        duration=180,
-        added_by="user123"
-    )
-
-    # Example chat ID
-    chat_id = "example_chat_123"
-
-    # Add track to queue
-    result = music_client.add_to_queue(chat_id, track)
-    if result:
-        print("Track added to queue")
-
-    # Get current queue
-    queue = music_client.get_queue(chat_id)
-    for i, track in enumerate(queue):
-        print(f"{i + 1}. {track.title} by {track.artist}")
-
-    # Get player status
-    status = music_client.get_player_status(chat_id)
-    print(f"Player status: {'Playing' if status['isPlaying'] else 'Paused'}")
\ No newline at end of file
+    async def main():
+        # Initialize the client
+        music_client = MusicAPIClient()
+
+        # Example track
+        track = Track(
+            title="Example Song",
+            artist="Example Artist",
+            url="https://example.com/song.mp3",
+            duration=180,
+            added_by="user123"
+        )
+
+        # Example chat ID
+        chat_id = "example_chat_123"
+
+        # Add track to queue
+        result = await music_client.add_to_queue(chat_id, track)
+        if result:
+            print("Track added to queue")
+
+        # Get current queue
+        queue = await music_client.get_queue(chat_id)
+        for i, track in enumerate(queue):
+            print(f"{i + 1}. {track.title} by {track.artist}")
+
+        # Get player status
+        status = await music_client.get_player_status(chat_id)
+        print(f"Player status: {'Playing' if status['isPlaying'] else 'Paused'}")
+
+    async def benchmark():
+        # Queue a 50-track playlist against a local stub API: one add per track vs coalesced vs batch
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        request_count = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            wbufsize = 64 * 1024
+
+            def _reply(self):
+                nonlocal request_count
+                request_count += 1
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                time.sleep(0.005)
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            do_POST = do_DELETE = do_GET = _reply
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ["API_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+        music_client = MusicAPIClient()
+        playlist = [Track(title=f"Song {i}", artist="Artist", url=f"https://example.com/{i}.mp3") for i in range(50)]
+
+        async def measure(label, queue_playlist):
+            nonlocal request_count
+            request_count = 0
+            started = time.perf_counter()
+            await queue_playlist()
+            print(f"{label}: {request_count} requests, {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        async def one_by_one():
+            for track in playlist:
+                await music_client.add_to_queue("bench", track)
+
+        for batch_endpoints in (False, True):
+            music_client.batch_endpoints = batch_endpoints
+            print(f"Batch endpoints {'enabled' if batch_endpoints else 'disabled'}:")
+            await measure("  Sequential add_to_queue", one_by_one)
+            await measure("  Concurrent add_to_queue",
+                          lambda: asyncio.gather(*(music_client.add_to_queue("bench", track) for track in playlist)))
+            await measure("  add_many_to_queue", lambda: music_client.add_many_to_queue("bench", playlist))
+        await measure("1,000 concurrent get_player_status (cached)",
+                      lambda: asyncio.gather(*(music_client.get_player_status("bench") for _ in range(1000))))
+        await get_http_client().close()
+        server.shutdown()
+
+    import sys
+    asyncio.run(benchmark() if "--benchmark" in sys.argv else main())
\ No newline at end of file
@@ -1,16 +1,19 @@
 import asyncio
 import os
-from typing import Optional
-import requests
+from typing import List, Optional
 from dotenv import load_dotenv
+from services.http_client import get_http_client
 from utils.logger import logger
+from utils.mp3 import sample_windows
 
 load_dotenv()
 
 class AudDAPIClient:
     def __init__(self):
         self.api_token = os.getenv("AUDD_API_TOKEN")
-        self.base_url = "https://api.audd.io/"
+        self.base_url = os.getenv("AUDD_API_URL", "https://api.audd.io/")
+        self.sample_seconds = float(os.getenv("RECOGNITION_SAMPLE_SECONDS", 15))
+        self.sample_window_count = int(os.getenv("RECOGNITION_SAMPLE_WINDOWS", 1))
 
     async def detect_song(self, file_data: bytes) -> Optional[dict]:
         try:
@@ -26,17 +29,35 @@ class AudDAPIClient:
                     logger.error("Failed to convert hex string to bytes")
                     return None
 
+            samples = await asyncio.to_thread(sample_windows, file_data, self.sample_seconds, self.sample_window_count)
+            return await self.recognize_samples(samples)
+
+        except Exception as e:
+            logger.error(f"Error with AudD API: {e}")
+            return None
+
+    async def recognize_samples(self, samples: List) -> Optional[dict]:
+        """Recognize already cut sample windows, trying them in order"""
+        for sample in samples:
+            metadata = await self._recognize(sample)
+            if metadata:
+                return metadata
+        return None
+
+    async def _recognize(self, file_data: bytes) -> Optional[dict]:
+        try:
             data = {
                 'api_token': self.api_token,
                 'return': 'spotify,apple_music,deezer'  # Optional music services
             }
 
             files = {
-                'file': ('audio.mp3', file_data, 'audio/mpeg')
+                'file': ('audio.mp3', bytes(file_data), 'audio/mpeg')
             }
 
-            logger.debug("Sending request to AudD API...")
-            response = requests.post(
+            logger.debug(f"Sending {len(file_data)} bytes to AudD API...")
+            response = await get_http_client().request(
+                'POST',
                 self.base_url,
                 data=data,
                 files=files
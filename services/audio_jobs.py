@@ -0,0 +1,114 @@
+import asyncio
+import contextlib
+import os
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+
+class AudioJobRejected(Exception):
+    pass
+
+
+class AudioJobError(Exception):
+    pass
+
+
+class AudioJobExecutor:
+    """Runs external audio tools (ffmpeg) as asyncio subprocesses.
+
+    At most max_concurrent jobs run at once and at most max_queued wait for a slot;
+    further jobs are rejected. A job that times out or whose caller is cancelled has
+    its process killed.
+    """
+
+    def __init__(self, max_concurrent: int = None, max_queued: int = None, timeout: float = None):
+        self.max_concurrent = max_concurrent or int(os.getenv("AUDIO_JOB_CONCURRENCY", os.cpu_count() or 1))
+        self.max_queued = max_queued or int(os.getenv("AUDIO_JOB_QUEUE_LIMIT", 32))
+        self.timeout = timeout or float(os.getenv("AUDIO_JOB_TIMEOUT", 120))
+        self.metrics_interval = int(os.getenv("AUDIO_JOB_METRICS_INTERVAL", 50))
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._queued = 0
+        self._running = 0
+        self._counters = {"completed": 0, "failed": 0, "rejected": 0, "timed_out": 0, "cancelled": 0}
+        self._durations = deque(maxlen=256)
+
+    async def run(self, command: list, input_data=None, timeout: float = None) -> bytes:
+        if self._queued >= self.max_queued:
+            self._counters["rejected"] += 1
+            raise AudioJobRejected(f"Audio job queue is full ({self._queued} waiting)")
+
+        self._queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._queued -= 1
+
+        self._running += 1
+        started = time.monotonic()
+        process = None
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=asyncio.subprocess.PIPE if input_data is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await asyncio.wait_for(process.communicate(input_data), timeout or self.timeout)
+            if process.returncode != 0:
+                raise AudioJobError(stderr.decode(errors='replace').strip())
+
+            self._counters["completed"] += 1
+            return stdout
+
+        except asyncio.TimeoutError:
+            self._counters["timed_out"] += 1
+            raise
+        except asyncio.CancelledError:
+            self._counters["cancelled"] += 1
+            raise
+        except Exception:
+            self._counters["failed"] += 1
+            raise
+        finally:
+            if process is not None and process.returncode is None:
+                process.kill()
+                with contextlib.suppress(Exception):
+                    await asyncio.shield(process.wait())
+            self._running -= 1
+            self._slots.release()
+            duration = time.monotonic() - started
+            self._durations.append(duration)
+            logger.debug(f"Audio job {command[0]} finished in {duration:.2f}s, queue depth {self._queued}")
+            self._report()
+
+    def get_metrics(self) -> dict:
+        durations = sorted(self._durations)
+        return {
+            "queue_depth": self._queued,
+            "running": self._running,
+            **self._counters,
+            "avg_duration": sum(durations) / len(durations) if durations else 0.0,
+            "p95_duration": durations[int(len(durations) * 0.95)] if durations else 0.0
+        }
+
+    def _report(self):
+        finished = sum(self._counters[outcome] for outcome in ("completed", "failed", "timed_out", "cancelled"))
+        if self.metrics_interval and finished % self.metrics_interval == 0:
+            logger.info(f"Audio jobs after {finished} runs: {self.get_metrics()}")
+
+
+_shared_executor = None
+
+
+def get_audio_job_executor() -> AudioJobExecutor:
+    """The process-wide executor, so AUDIO_JOB_CONCURRENCY bounds every audio job in the process"""
+    global _shared_executor
+    if _shared_executor is None:
+        _shared_executor = AudioJobExecutor()
+    return _shared_executor
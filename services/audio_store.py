@@ -0,0 +1,273 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+
+class AudioQuotaExceeded(Exception):
+    pass
+
+
+class _StoredAudio:
+    def __init__(self, owner: str, size: int, data=None, path: str = None):
+        self.owner = owner
+        self.size = size
+        self.data = data
+        self.path = path
+        self.last_access = time.monotonic()
+        self.spilling = False
+
+
+class AudioBlobStore:
+    """Binary store for uploaded and generated audio.
+
+    Entries are kept in memory up to a byte budget and spilled to disk in
+    least-recently-used order. Entries expire after a period
+    without access and every owner is limited to a byte quota. Files are written
+    outside the lock, but put, put_file and get still do disk IO and belong in a
+    thread when called from the event loop.
+    """
+
+    def __init__(self, memory_budget: int = None, disk_budget: int = None, ttl: float = None,
+                 user_quota: int = None, spill_dir: str = None):
+        self.memory_budget = memory_budget or int(os.getenv("AUDIO_STORE_MEMORY_BUDGET", 256 * 1024 * 1024))
+        self.disk_budget = disk_budget or int(os.getenv("AUDIO_STORE_DISK_BUDGET", 2 * 1024 * 1024 * 1024))
+        self.ttl = ttl or float(os.getenv("AUDIO_STORE_TTL", 3600))
+        self.user_quota = user_quota or int(os.getenv("AUDIO_STORE_USER_QUOTA", 100 * 1024 * 1024))
+        self.spill_dir = spill_dir or os.getenv("AUDIO_STORE_SPILL_DIR")
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._cleanup = None
+        else:
+            # A private temporary directory is removed on close() or at interpreter exit
+            self.spill_dir = tempfile.mkdtemp(prefix="kneo_audio_")
+            self._cleanup = weakref.finalize(self, shutil.rmtree, self.spill_dir, ignore_errors=True)
+
+        self._entries: "OrderedDict[Tuple[str, str], _StoredAudio]" = OrderedDict()
+        self._owner_bytes: Dict[str, int] = {}
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, owner: str, key: str, data) -> str:
+        size = len(data)
+        self._check_size(size)
+
+        if size > self.memory_budget:
+            entry = _StoredAudio(owner, size, path=self._write_spill_file(data))
+        else:
+            entry = _StoredAudio(owner, size, data=memoryview(data).toreadonly())
+
+        with self._lock:
+            self._insert((owner, key), entry)
+            spills = self._take_spills()
+
+        self._write_spills(spills)
+        logger.debug(f"Stored {size} bytes of audio for {owner}/{key}")
+        return key
+
+    def put_file(self, owner: str, key: str, path: str) -> str:
+        """Store the file at path as a disk entry without reading it into memory"""
+        size = os.path.getsize(path)
+        self._check_size(size)
+
+        # A hard link keeps the entry valid when the source file is later removed
+        spill_path = os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.bin")
+        try:
+            os.link(path, spill_path)
+        except OSError:
+            shutil.copyfile(path, spill_path)
+
+        with self._lock:
+            self._insert((owner, key), _StoredAudio(owner, size, path=spill_path))
+
+        logger.debug(f"Stored {size} bytes of audio for {owner}/{key} from {path}")
+        return key
+
+    def get(self, owner: str, key: str) -> Optional[memoryview]:
+        with self._lock:
+            self._purge_expired()
+            entry = self._entries.get((owner, key))
+            if entry is None:
+                return None
+
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end((owner, key))
+            if entry.data is not None:
+                return entry.data
+            path = entry.path
+
+        # Every consumer needs the whole file anyway, and a plain read leaves no map open
+        try:
+            with open(path, 'rb') as file:
+                return memoryview(file.read())
+        except FileNotFoundError:
+            # Evicted after the lock was released
+            return None
+
+    def delete(self, owner: str, key: str):
+        with self._lock:
+            self._remove((owner, key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "owners": len(self._owner_bytes)
+            }
+
+    def close(self):
+        """Drop every entry and remove the spill directory if the store created it"""
+        with self._lock:
+            for entry_key in list(self._entries):
+                self._remove(entry_key)
+        if self._cleanup is not None:
+            self._cleanup()
+
+    def _check_size(self, size: int):
+        if size > self.user_quota:
+            raise AudioQuotaExceeded(f"Audio of {size} bytes exceeds the per-user quota of {self.user_quota} bytes")
+        # Such an entry could only be stored by evicting everything else, itself included
+        if size > self.disk_budget:
+            raise AudioQuotaExceeded(f"Audio of {size} bytes exceeds the disk budget of {self.disk_budget} bytes")
+
+    def _insert(self, entry_key: Tuple[str, str], entry: _StoredAudio):
+        owner = entry_key[0]
+        self._purge_expired()
+        self._remove(entry_key)
+        self._evict_owner(owner, entry.size)
+
+        self._entries[entry_key] = entry
+        self._owner_bytes[owner] = self._owner_bytes.get(owner, 0) + entry.size
+        if entry.data is not None:
+            self._memory_bytes += entry.size
+        else:
+            self._disk_bytes += entry.size
+        self._evict_disk_over_budget(keep=entry_key)
+
+    def _write_spill_file(self, data) -> str:
+        path = os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.bin")
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def _remove(self, entry_key: Tuple[str, str]):
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return
+
+        self._owner_bytes[entry.owner] -= entry.size
+        if not self._owner_bytes[entry.owner]:
+            del self._owner_bytes[entry.owner]
+
+        if entry.data is not None:
+            self._memory_bytes -= entry.size
+            entry.data = None
+        else:
+            self._disk_bytes -= entry.size
+            try:
+                os.unlink(entry.path)
+            except OSError as e:
+                logger.warning(f"Could not remove spilled audio {entry.path}: {e}")
+
+    def _purge_expired(self):
+        # Entries are ordered by last access, so expired ones sit at the front
+        threshold = time.monotonic() - self.ttl
+        while self._entries:
+            entry_key, entry = next(iter(self._entries.items()))
+            if entry.last_access > threshold:
+                break
+            logger.debug(f"Audio {entry_key[0]}/{entry_key[1]} expired")
+            self._remove(entry_key)
+
+    def _evict_owner(self, owner: str, incoming: int):
+        if self._owner_bytes.get(owner, 0) + incoming <= self.user_quota:
+            return
+        for entry_key in [k for k in self._entries if k[0] == owner]:
+            logger.info(f"Evicting audio {owner}/{entry_key[1]}: per-user quota reached")
+            self._remove(entry_key)
+            if self._owner_bytes.get(owner, 0) + incoming <= self.user_quota:
+                return
+
+    def _take_spills(self) -> list:
+        """Pick the least recently used memory entries to move to disk until memory is within budget"""
+        spills, excess = [], self._memory_bytes - self.memory_budget
+        for entry in self._entries.values():
+            if excess <= 0:
+                break
+            if entry.data is not None and not entry.spilling:
+                entry.spilling = True
+                spills.append((entry, entry.data))
+                excess -= entry.size
+        return spills
+
+    def _write_spills(self, spills: list):
+        # The files are written without holding the lock; an entry removed meanwhile just drops its file
+        for entry, data in spills:
+            try:
+                path = self._write_spill_file(data)
+            except OSError as e:
+                logger.error(f"Could not spill audio to {self.spill_dir}: {e}")
+                entry.spilling = False
+                continue
+            with self._lock:
+                entry.spilling = False
+                if entry.data is not data:
+                    os.unlink(path)
+                    continue
+                entry.path = path
+                entry.data = None
+                self._memory_bytes -= entry.size
+                self._disk_bytes += entry.size
+                self._evict_disk_over_budget()
+
+    def _evict_disk_over_budget(self, keep: Tuple[str, str] = None):
+        for entry_key, entry in list(self._entries.items()):
+            if self._disk_bytes <= self.disk_budget:
+                return
+            if entry.data is None and entry_key != keep:
+                logger.info(f"Evicting audio {entry_key[0]}/{entry_key[1]}: disk budget reached")
+                self._remove(entry_key)
+
+
+if __name__ == "__main__":
+    import resource
+    import sys
+    import tracemalloc
+
+    # Memory benchmark: 1,000 uploads of 5 MB tracks spread over 50 users
+    track_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    track_size = 5 * 1024 * 1024
+    spill_dir = tempfile.mkdtemp(prefix="kneo_audio_bench_")
+    store = AudioBlobStore(memory_budget=256 * 1024 * 1024, disk_budget=1024 * 1024 * 1024,
+                           user_quota=50 * 1024 * 1024, spill_dir=spill_dir)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for i in range(track_count):
+        track = bytearray(os.urandom(1024)) * (track_size // 1024)
+        store.put(f"user{i % 50}", str(i), track)
+        del track
+        if i % 10 == 0:
+            store.get(f"user{i % 50}", str(i))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+
+    print(f"Stored {track_count} x {track_size // (1024 * 1024)} MB in {elapsed:.2f}s")
+    print(f"Store stats: {store.stats()}")
+    print(f"Peak traced Python memory: {peak / (1024 * 1024):.1f} MB")
+    print(f"Max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+    shutil.rmtree(spill_dir, ignore_errors=True)
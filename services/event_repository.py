@@ -1,3 +1,173 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, List
+
+from dotenv import load_dotenv
+
+from models.Event import Event, EventType, Precision
+from utils.logger import logger
+
+load_dotenv()
+
+
 class EventRepository:
-    def __init__(self):
-        print("event")
+    """Events stored in a local SQLite database.
+
+    The time of an event is kept as its ISO string and as a Unix timestamp; the
+    timestamp is indexed on its own and together with the author, so a day's events
+    are read with an index range scan however many events are stored.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.getenv("EVENTS_DB", os.path.join(".cache", "events.sqlite3"))
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                around_ts REAL NOT NULL,
+                around TEXT NOT NULL,
+                precision TEXT NOT NULL,
+                description TEXT NOT NULL,
+                type TEXT NOT NULL,
+                author TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS events_around ON events (around_ts);
+            CREATE INDEX IF NOT EXISTS events_author_around ON events (author, around_ts);
+        """)
+
+    def add_event(self, event: Event) -> int:
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                """
+                INSERT INTO events (around_ts, around, precision, description, type, author, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                self._to_row(event)
+            )
+        logger.debug(f"Added event {cursor.lastrowid} for {event.author} at {event.around.isoformat()}")
+        return cursor.lastrowid
+
+    def add_events(self, events: Iterable[Event]) -> int:
+        """Insert events in one transaction and return how many were added"""
+        with self._lock, self._db:
+            cursor = self._db.executemany(
+                """
+                INSERT INTO events (around_ts, around, precision, description, type, author, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (self._to_row(event) for event in events)
+            )
+        return cursor.rowcount
+
+    def get_events_between(self, start: datetime, end: datetime, author: str = None) -> List[Event]:
+        """Events from start (inclusive) to end (exclusive), earliest first"""
+        query = "SELECT around, precision, description, type, author, created_at FROM events WHERE "
+        parameters = [start.timestamp(), end.timestamp()]
+        if author is not None:
+            query += "author = ? AND "
+            parameters.insert(0, author)
+        query += "around_ts >= ? AND around_ts < ? ORDER BY around_ts"
+
+        with self._lock:
+            rows = self._db.execute(query, parameters).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def check_what_we_have_today(self, author: str = None) -> List[Event]:
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return self.get_events_between(start, start + timedelta(days=1), author)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    @staticmethod
+    def _to_row(event: Event) -> tuple:
+        # Naive datetimes are local time, the same convention datetime.timestamp() applies
+        return (
+            event.around.timestamp(),
+            event.around.isoformat(),
+            event.precision.value,
+            event.description,
+            event.type.value,
+            event.author,
+            event.createdAt.isoformat()
+        )
+
+    @staticmethod
+    def _from_row(row: tuple) -> Event:
+        return Event(
+            around=datetime.fromisoformat(row[0]),
+            precision=Precision(row[1]),
+            description=row[2],
+            type=EventType(row[3]),
+            author=row[4],
+            createdAt=datetime.fromisoformat(row[5])
+        )
+
+
+if __name__ == "__main__":
+    import random
+    import sys
+    import tempfile
+    import time
+
+    # Benchmark: bulk insert of a million events spread over ten years and 1,000 authors, then
+    # "today's events" through the index range scan vs a full table scan
+    event_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(1)
+    now = datetime.now()
+    precisions, types = list(Precision), list(EventType)
+
+    def generate_events():
+        for i in range(event_count):
+            yield Event(
+                around=now + timedelta(seconds=rng.uniform(-5 * 365 * 86400, 5 * 365 * 86400)),
+                precision=precisions[i % len(precisions)],
+                description=f"Event {i}",
+                type=types[i % len(types)],
+                author=f"user{rng.randrange(1000)}",
+                createdAt=now
+            )
+
+    with tempfile.TemporaryDirectory() as directory:
+        repository = EventRepository(os.path.join(directory, "events.sqlite3"))
+
+        started = time.perf_counter()
+        batch = []
+        for event in generate_events():
+            batch.append(event)
+            if len(batch) == 50_000:
+                repository.add_events(batch)
+                batch = []
+        repository.add_events(batch)
+        print(f"Bulk insert of {repository.count()} events: {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        for i in range(100):
+            repository.add_event(Event(now, Precision.MORNING, f"Single {i}", EventType.REMINDER, "user1", now))
+        print(f"Single inserts: {(time.perf_counter() - started) * 10:.2f} ms each")
+
+        def measure(label, query, repeat=20):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                result = query()
+            print(f"{label}: {(time.perf_counter() - started) / repeat * 1000:.2f} ms, {len(result)} events")
+
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        bounds = (start.timestamp(), (start + timedelta(days=1)).timestamp())
+        measure("Today, index range scan", repository.check_what_we_have_today)
+        measure("Today for one author", lambda: repository.check_what_we_have_today("user1"))
+        measure("Today, full table scan", lambda: repository._db.execute(
+            "SELECT * FROM events NOT INDEXED WHERE around_ts >= ? AND around_ts < ?", bounds
+        ).fetchall(), repeat=3)
+        for row in repository._db.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM events WHERE around_ts >= ? AND around_ts < ?", bounds
+        ):
+            print(f"Query plan: {row[-1]}")
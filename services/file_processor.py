@@ -1,54 +1,120 @@
+import asyncio
 import os
-import tempfile
-from utils.logger import logger
-import subprocess
+from typing import Optional
+
 from dotenv import load_dotenv
 
+from services.audio_jobs import AudioJobError, AudioJobExecutor, AudioJobRejected, get_audio_job_executor
+from utils.logger import logger
+from utils.mp3 import Mp3Stream, concat_streams, parse_mp3
+
+# A full job queue, a timeout or a missing ffmpeg binary fail a job just like a bad exit code
+_JOB_FAILURES = (AudioJobError, AudioJobRejected, asyncio.TimeoutError, OSError)
+
 
 class LocalAudioProcessor:
-    def __init__(self):
+    def __init__(self, job_executor: AudioJobExecutor = None):
         load_dotenv()
-        self.ffmpeg_path = os.getenv("FFMPEG_PATH")
+        self.ffmpeg_path = os.getenv("FFMPEG_PATH", "ffmpeg")
+        self.jobs = job_executor or get_audio_job_executor()
+
+    async def merge_audio_files(self, intro_audio: bytes, main_audio: bytes) -> bytes:
+        """Prepend intro_audio to main_audio.
 
-    def merge_audio_files(self, intro_audio: bytes, main_audio: bytes) -> bytes:
+        Compatible MP3 inputs are joined frame by frame in memory. Only inputs that
+        are not MP3 or whose sample rate or channel layout differ go through ffmpeg,
+        and then only the mismatching input is transcoded. Parsing and joining frames
+        is pure-Python work over the whole file, so it runs in a thread.
+        """
         try:
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as intro_file, \
-                    tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as main_file, \
-                    tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as output_file:
-
-                # Write bytes to temp files
-                intro_file.write(intro_audio)
-                main_file.write(main_audio)
-                intro_file.flush()
-                main_file.flush()
-
-                command = [
-                    self.ffmpeg_path,
-                    "-y",
-                    "-i", intro_file.name,
-                    "-i", main_file.name,
-                    "-filter_complex",
-                    "[0:a][1:a]concat=n=2:v=0:a=1[out]",
-                    "-map", "[out]",
-                    output_file.name
-                ]
-
-                result = subprocess.run(command, capture_output=True, text=True)
-
-                if result.returncode != 0:
-                    logger.error(f"FFmpeg error: {result.stderr}")
+            main = await asyncio.to_thread(parse_mp3, main_audio)
+            if main is None or main.layer != 3:
+                logger.info("Main audio is not MPEG layer III, transcoding it")
+                main = await self._transcode_to_mp3(main_audio)
+                if main is None:
                     return None
 
-                with open(output_file.name, 'rb') as f:
-                    merged_data = f.read()
-
-            # Cleanup temp files
-            os.unlink(intro_file.name)
-            os.unlink(main_file.name)
-            os.unlink(output_file.name)
+            intro = await asyncio.to_thread(parse_mp3, intro_audio)
+            if intro is None or not intro.is_compatible(main):
+                logger.info(f"Transcoding intro to {main.sample_rate} Hz, {main.channels} channel(s)")
+                intro = await self._transcode_to_mp3(intro_audio, main.sample_rate, main.channels)
+                if intro is None:
+                    return None
 
-            return merged_data
+            return await asyncio.to_thread(concat_streams, [intro, main])
 
         except Exception as e:
             logger.error(f"Error merging audio files: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    async def _transcode_to_mp3(self, audio_data: bytes, sample_rate: int = 44100, channels: int = 2) -> Optional[Mp3Stream]:
+        command = [
+            self.ffmpeg_path,
+            "-hide_banner",
+            "-loglevel", "error",
+            "-i", "pipe:0",
+            "-ar", str(sample_rate),
+            "-ac", str(channels),
+            "-codec:a", "libmp3lame",
+            "-f", "mp3",
+            "pipe:1"
+        ]
+
+        try:
+            output = await self.jobs.run(command, audio_data)
+        except _JOB_FAILURES as e:
+            logger.error(f"FFmpeg error: {e!r}")
+            return None
+
+        return await asyncio.to_thread(parse_mp3, output)
+
+    async def decode_pcm(self, audio_data: bytes, sample_rate: int, max_seconds: float) -> Optional[bytes]:
+        """Decode the start of audio_data to mono signed 16-bit little-endian PCM"""
+        command = [
+            self.ffmpeg_path,
+            "-hide_banner",
+            "-loglevel", "error",
+            "-i", "pipe:0",
+            "-t", str(max_seconds),
+            "-ac", "1",
+            "-ar", str(sample_rate),
+            "-f", "s16le",
+            "pipe:1"
+        ]
+
+        try:
+            return await self.jobs.run(command, audio_data)
+        except _JOB_FAILURES as e:
+            logger.error(f"FFmpeg decode error: {e!r}")
+            return None
+
+
+if __name__ == "__main__":
+    import subprocess
+    import sys
+    import tempfile
+    import time
+
+    # Benchmark: frame-level merge against the full ffmpeg concat re-encode
+    with open(sys.argv[1], "rb") as file:
+        intro_data = file.read()
+    with open(sys.argv[2], "rb") as file:
+        main_data = file.read()
+
+    processor = LocalAudioProcessor()
+    started = time.perf_counter()
+    merged = asyncio.run(processor.merge_audio_files(intro_data, main_data))
+    print(f"Frame-level merge: {time.perf_counter() - started:.3f}s, {len(merged or b'')} bytes")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = [os.path.join(tmp_dir, name) for name in ("intro.mp3", "main.mp3", "out.mp3")]
+        for path, data in zip(paths, (intro_data, main_data)):
+            with open(path, "wb") as file:
+                file.write(data)
+
+        started = time.perf_counter()
+        subprocess.run([
+            processor.ffmpeg_path, "-y", "-loglevel", "error", "-i", paths[0], "-i", paths[1],
+            "-filter_complex", "[0:a][1:a]concat=n=2:v=0:a=1[out]", "-map", "[out]", paths[2]
+        ], check=True)
+        print(f"ffmpeg concat re-encode: {time.perf_counter() - started:.3f}s, {os.path.getsize(paths[2])} bytes")
@@ -1,17 +1,147 @@
+import asyncio
 import os
+import re
+import time
+from typing import List
+
 from google.cloud import texttospeech
 from dotenv import load_dotenv
+
+from services.tts_cache import TTSCache
 from utils.logger import logger
+from utils.mp3 import concat_streams, parse_mp3
+
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+_SSML_TAG = re.compile(r'(<[^>]+>)')
+_SSML_BLOCK_END = re.compile(r'</(p|s|paragraph|sentence)\s*>')
+_SPEAK = re.compile(r'^\s*(<speak[^>]*>)(.*)</speak>\s*$', re.DOTALL)
+
+
+def _text_units(text: str, max_bytes: int) -> List[str]:
+    units = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if len(sentence.encode('utf-8')) <= max_bytes:
+            units.append(sentence)
+            continue
+        # A sentence longer than a whole chunk is split between words
+        units.extend(word for word in sentence.split(' ') if word)
+    return units
+
+
+def _ssml_units(body: str) -> List[str]:
+    # Only split outside of elements so every chunk stays well-formed SSML
+    units, current, depth = [], "", 0
+    for token in _SSML_TAG.split(body):
+        if not token:
+            continue
+        if token.startswith('<'):
+            current += token
+            if token.startswith('</'):
+                depth -= 1
+                if depth == 0 and _SSML_BLOCK_END.match(token):
+                    units.append(current)
+                    current = ""
+            elif token.endswith('/>'):
+                if depth == 0:
+                    units.append(current)
+                    current = ""
+            elif not token.startswith('<!--') and not token.startswith('<?'):
+                depth += 1
+        elif depth > 0:
+            current += token
+        else:
+            sentences = _SENTENCE_END.split(token)
+            for sentence in sentences[:-1]:
+                units.append(current + sentence + " ")
+                current = ""
+            current += sentences[-1]
+    if current.strip():
+        units.append(current)
+    return units
+
+
+def _pack(units: List[str], max_bytes: int, separator: str) -> List[str]:
+    chunks, current = [], ""
+    for unit in units:
+        candidate = f"{current}{separator}{unit}" if current else unit
+        if current and len(candidate.encode('utf-8')) > max_bytes:
+            chunks.append(current)
+            current = unit
+        else:
+            current = candidate
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+def split_for_synthesis(text: str, max_bytes: int) -> List[str]:
+    """Split plain text or SSML on sentence boundaries into chunks of at most max_bytes"""
+    ssml = _SPEAK.match(text)
+    if not ssml:
+        return _pack(_text_units(text, max_bytes), max_bytes, " ")
+
+    opening_tag, body = ssml.groups()
+    wrapper_bytes = len(opening_tag.encode('utf-8')) + len("</speak>")
+    chunks = _pack(_ssml_units(body), max_bytes - wrapper_bytes, "")
+    return [f"{opening_tag}{chunk}</speak>" for chunk in chunks]
+
 
 class GoogleTTSClient:
-    def __init__(self):
+    def __init__(self, cache: TTSCache = None):
         load_dotenv()
         credentials_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
         os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
-        self.client = texttospeech.TextToSpeechClient()
+        # The gRPC aio channel binds to the running loop, so the client is created on first use
+        self.client = None
+        self.cache = cache or TTSCache()
+        self.timeout = float(os.getenv("TTS_TIMEOUT", 30))
+        self.max_chunk_bytes = int(os.getenv("TTS_MAX_CHUNK_BYTES", 1500))
+        self.request_limiter = asyncio.Semaphore(int(os.getenv("TTS_MAX_CONCURRENT_REQUESTS", 8)))
+
+    def _get_client(self) -> texttospeech.TextToSpeechAsyncClient:
+        if self.client is None:
+            self.client = texttospeech.TextToSpeechAsyncClient()
+        return self.client
 
     async def synthesize_speech(self, text: str, voice_name: str = "en-US-Casual-K",
-                                language_code: str = "en-US") -> bytes:
+                                language_code: str = "en-US", timeout: float = None) -> bytes:
+        tasks = self._start_chunks(text, voice_name, language_code, timeout)
+        try:
+            chunks = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if not all(chunks):
+            return None
+        if len(chunks) == 1:
+            return chunks[0]
+
+        # Parsing every frame is pure-Python work, kept off the event loop
+        return await asyncio.to_thread(self._join_chunks, chunks)
+
+    @staticmethod
+    def _join_chunks(chunks: List[bytes]) -> bytes:
+        streams = [parse_mp3(chunk) for chunk in chunks]
+        if not all(streams):
+            return b"".join(chunks)
+        return concat_streams(streams)
+
+    def _start_chunks(self, text: str, voice_name: str, language_code: str, timeout: float) -> List[asyncio.Task]:
+        deadline = time.monotonic() + (timeout or self.timeout)
+        chunks = split_for_synthesis(text, self.max_chunk_bytes)
+        if len(chunks) > 1:
+            logger.info(f"Synthesizing {len(chunks)} chunks in parallel")
+        return [
+            asyncio.create_task(self._synthesize_cached(chunk, voice_name, language_code, deadline))
+            for chunk in chunks
+        ]
+
+    async def _synthesize_cached(self, text: str, voice_name: str, language_code: str, deadline: float) -> bytes:
+        key = TTSCache.make_key(text, voice_name, language_code, {"audio_encoding": "MP3"})
+        return await self.cache.get_or_create(key, lambda: self._synthesize(text, voice_name, language_code, deadline))
+
+    async def _synthesize(self, text: str, voice_name: str, language_code: str, deadline: float) -> bytes:
         try:
             # Check if text contains SSML tags
             if text.strip().startswith('<speak'):
@@ -27,15 +157,95 @@ class GoogleTTSClient:
                 audio_encoding=texttospeech.AudioEncoding.MP3
             )
 
-            response = self.client.synthesize_speech(
-                input=synthesis_input,
-                voice=voice,
-                audio_config=audio_config
-            )
+            async with self.request_limiter:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("TTS deadline exceeded before the request was sent")
+
+                response = await self._get_client().synthesize_speech(
+                    input=synthesis_input,
+                    voice=voice,
+                    audio_config=audio_config,
+                    timeout=remaining
+                )
 
             logger.info(f"Speech synthesized for text: {text[:50]}...")
             return response.audio_content
 
         except Exception as e:
             logger.error(f"Error synthesizing speech: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+_shared_client = None
+
+
+def get_tts_client() -> GoogleTTSClient:
+    """The process-wide TTS client, so every caller shares one channel, limiter and cache"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = GoogleTTSClient()
+    return _shared_client
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    import grpc
+    from google.cloud.texttospeech_v1.services.text_to_speech.transports import (
+        TextToSpeechGrpcAsyncIOTransport, TextToSpeechGrpcTransport
+    )
+
+    # Benchmark against a local stub TextToSpeech gRPC server answering after 200 ms: 16 syntheses started
+    # at once, through the blocking client called from coroutines (the old path) vs the async client
+    request_count = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    service = "google.cloud.texttospeech.v1.TextToSpeech"
+
+    def synthesize_stub(request, context):
+        time.sleep(0.2)
+        return texttospeech.SynthesizeSpeechResponse(audio_content=b"\xff\xfb" + request.input.text.encode())
+
+    # The stub serves from its own threads: the blocking client stalls the event loop while it waits
+    server = grpc.server(ThreadPoolExecutor(max_workers=request_count))
+    server.add_generic_rpc_handlers([grpc.method_handlers_generic_handler(service, {
+        "SynthesizeSpeech": grpc.unary_unary_rpc_method_handler(
+            synthesize_stub,
+            request_deserializer=texttospeech.SynthesizeSpeechRequest.deserialize,
+            response_serializer=texttospeech.SynthesizeSpeechResponse.serialize
+        )
+    })])
+    address = f"127.0.0.1:{server.add_insecure_port('127.0.0.1:0')}"
+    server.start()
+
+    async def main():
+        texts = [f"Announcement number {i}." for i in range(request_count)]
+
+        blocking = texttospeech.TextToSpeechClient(
+            transport=TextToSpeechGrpcTransport(channel=grpc.insecure_channel(address))
+        )
+
+        async def synthesize_blocking(text):
+            return blocking.synthesize_speech(
+                input=texttospeech.SynthesisInput(text=text),
+                voice=texttospeech.VoiceSelectionParams(language_code="en-US", name="en-US-Casual-K"),
+                audio_config=texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
+            ).audio_content
+
+        started = time.perf_counter()
+        await asyncio.gather(*(synthesize_blocking(text) for text in texts))
+        print(f"Blocking client: {time.perf_counter() - started:.2f}s for {request_count} syntheses")
+
+        with tempfile.TemporaryDirectory() as directory:
+            tts = GoogleTTSClient(cache=TTSCache(cache_dir=directory))
+            tts.client = texttospeech.TextToSpeechAsyncClient(
+                transport=TextToSpeechGrpcAsyncIOTransport(channel=grpc.aio.insecure_channel(address))
+            )
+            started = time.perf_counter()
+            results = await asyncio.gather(*(tts.synthesize_speech(text) for text in texts))
+            print(f"Async client, {tts.request_limiter._value} concurrent requests: "
+                  f"{time.perf_counter() - started:.2f}s for {sum(1 for result in results if result)} syntheses")
+
+    asyncio.run(main())
+    server.stop(None)
@@ -0,0 +1,227 @@
+import asyncio
+import contextlib
+import os
+import random
+import time
+from typing import AsyncIterator, Dict
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+try:
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+_IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+_RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class _CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        # Half-open: let a single trial request through once the reset timeout has passed
+        if self.trial_running or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self.trial_running = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Free the half-open slot when a request ends without an outcome, e.g. on cancellation"""
+        self.trial_running = False
+
+
+class HttpClient:
+    """Shared async HTTP layer for the service clients.
+
+    One pooled keep-alive connection set (HTTP/2 when h2 is installed) with a
+    concurrency limit per host, retries with jittered exponential backoff and a
+    circuit breaker per host.
+    """
+
+    def __init__(self):
+        self.max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+        self.per_host_limit = int(os.getenv("HTTP_PER_HOST_LIMIT", 10))
+        self.timeout = float(os.getenv("HTTP_TIMEOUT", 30))
+        self.retries = int(os.getenv("HTTP_RETRIES", 2))
+        self.backoff_base = float(os.getenv("HTTP_BACKOFF_BASE", 0.2))
+        self.backoff_cap = float(os.getenv("HTTP_BACKOFF_CAP", 5))
+        self.breaker_threshold = int(os.getenv("HTTP_BREAKER_THRESHOLD", 5))
+        self.breaker_reset = float(os.getenv("HTTP_BREAKER_RESET", 30))
+
+        self._client = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, _CircuitBreaker] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=_HTTP2_AVAILABLE,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    def _host_state(self, url: str):
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+            self._breakers[host] = _CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+        return host, self._host_limits[host], self._breakers[host]
+
+    async def request(self, method: str, url: str, idempotent: bool = None, **kwargs) -> httpx.Response:
+        """Send a request with retries; pass idempotent=False for calls that must not run twice"""
+        host, host_limit, breaker = self._host_state(url)
+        if idempotent is None:
+            idempotent = method.upper() in _IDEMPOTENT_METHODS
+
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {host}")
+
+            try:
+                async with host_limit:
+                    response = await self._get_client().request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                # Requests that never reached the server are always safe to repeat
+                retryable = idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+                if not retryable or attempt == self.retries:
+                    raise
+                logger.warning(f"{method} {host} failed ({e.__class__.__name__}), retrying")
+                await self._backoff(attempt)
+                continue
+            except BaseException:
+                breaker.release_trial()
+                raise
+
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            retryable = response.status_code == 429 or (idempotent and response.status_code in _RETRY_STATUSES)
+            if retryable and attempt < self.retries:
+                logger.warning(f"{method} {host} returned {response.status_code}, retrying")
+                await self._backoff(attempt, response.headers.get("Retry-After"))
+                continue
+            return response
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        host, host_limit, breaker = self._host_state(url)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {host}")
+
+        try:
+            async with host_limit:
+                async with self._get_client().stream(method, url, **kwargs) as response:
+                    if response.status_code >= 500:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                    yield response
+        except httpx.TransportError:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release_trial()
+            raise
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _backoff(self, attempt: int, retry_after: str = None):
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        await asyncio.sleep(delay)
+
+
+_shared_client = None
+
+
+def get_http_client() -> HttpClient:
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = HttpClient()
+    return _shared_client
+
+
+if __name__ == "__main__":
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import requests
+
+    # Benchmark: per-call latency against a local server, new connection per call vs the shared pool
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Send headers and body in one segment so delayed ACKs do not skew keep-alive timings
+        wbufsize = 64 * 1024
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    calls = 500
+
+    started = time.perf_counter()
+    for _ in range(calls):
+        requests.get(url)
+    print(f"requests.get per call: {(time.perf_counter() - started) / calls * 1000:.3f} ms")
+
+    async def pooled():
+        client = get_http_client()
+        await client.request("GET", url)
+        started = time.perf_counter()
+        for _ in range(calls):
+            await client.request("GET", url)
+        print(f"shared HttpClient per call: {(time.perf_counter() - started) / calls * 1000:.3f} ms")
+        await client.close()
+
+    asyncio.run(pooled())
+    server.shutdown()
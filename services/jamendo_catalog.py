@@ -0,0 +1,190 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+
+class JamendoCatalog:
+    """Local SQLite copy of Jamendo track metadata indexed by fuzzytag.
+
+    Tracks are selected at random, weighted by how many of the requested tags they
+    carry and by popularity, and a chat is not offered the same track twice until
+    it has been through every track matching its tags.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.getenv("JAMENDO_CATALOG_DB", os.path.join(".cache", "jamendo.sqlite3"))
+        self.candidate_limit = int(os.getenv("JAMENDO_CATALOG_CANDIDATES", 500))
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS tracks (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                artist TEXT NOT NULL,
+                album TEXT,
+                release_date TEXT,
+                duration INTEGER,
+                stream_url TEXT NOT NULL,
+                popularity REAL NOT NULL DEFAULT 0,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS track_tags (
+                tag TEXT NOT NULL,
+                track_id TEXT NOT NULL,
+                PRIMARY KEY (tag, track_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS tag_refresh (
+                tag TEXT PRIMARY KEY,
+                refreshed_at REAL NOT NULL DEFAULT 0,
+                track_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS chat_plays (
+                chat_id TEXT NOT NULL,
+                track_id TEXT NOT NULL,
+                played_at REAL NOT NULL,
+                PRIMARY KEY (chat_id, track_id)
+            ) WITHOUT ROWID;
+        """)
+
+    @staticmethod
+    def normalize_tags(tags: Iterable[str]) -> List[str]:
+        return sorted({tag.strip().lower() for tag in tags if tag and tag.strip()})
+
+    def add_tracks(self, tag: str, tracks: List[dict]) -> int:
+        """Upsert a page of tracks under tag and return how many were new"""
+        now = time.time()
+        with self._lock, self._db:
+            known = {
+                row[0] for row in self._db.execute(
+                    f"SELECT id FROM tracks WHERE id IN ({','.join('?' * len(tracks))})",
+                    [track["id"] for track in tracks]
+                )
+            } if tracks else set()
+
+            self._db.executemany(
+                """
+                INSERT INTO tracks (id, name, artist, album, release_date, duration, stream_url, popularity, fetched_at)
+                VALUES (:id, :name, :artist, :album, :release_date, :duration, :stream_url, :popularity, :fetched_at)
+                ON CONFLICT(id) DO UPDATE SET
+                    stream_url = excluded.stream_url,
+                    popularity = excluded.popularity,
+                    fetched_at = excluded.fetched_at
+                """,
+                [{**track, "fetched_at": now} for track in tracks]
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO track_tags (tag, track_id) VALUES (?, ?)",
+                [
+                    (track_tag, track["id"])
+                    for track in tracks
+                    for track_tag in self.normalize_tags([tag, *track.get("tags", [])])
+                ]
+            )
+        return len({track["id"] for track in tracks} - known)
+
+    def mark_refreshed(self, tag: str):
+        with self._lock, self._db:
+            self._db.execute(
+                """
+                INSERT INTO tag_refresh (tag, refreshed_at, track_count)
+                VALUES (?, ?, (SELECT COUNT(*) FROM track_tags WHERE tag = ?))
+                ON CONFLICT(tag) DO UPDATE SET
+                    refreshed_at = excluded.refreshed_at,
+                    track_count = excluded.track_count
+                """,
+                (tag, time.time(), tag)
+            )
+
+    def track_tag(self, tag: str):
+        """Register tag for scheduled refreshes without marking it as refreshed"""
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO tag_refresh (tag) VALUES (?)", (tag,))
+
+    def stale_tags(self, max_age: float) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT tag FROM tag_refresh WHERE refreshed_at < ? ORDER BY refreshed_at",
+                (time.time() - max_age,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def has_tag(self, tag: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM track_tags WHERE tag = ? LIMIT 1", (tag,)).fetchone() is not None
+
+    def select_track(self, tags: List[str], chat_id: str = None) -> Optional[dict]:
+        tags = self.normalize_tags(tags)
+        if not tags:
+            return None
+
+        with self._lock, self._db:
+            candidates = self._candidates(tags, chat_id)
+            if not candidates and chat_id is not None:
+                # Every matching track has been played in this chat: start a new rotation
+                self._db.execute(
+                    f"""
+                    DELETE FROM chat_plays WHERE chat_id = ? AND track_id IN (
+                        SELECT track_id FROM track_tags WHERE tag IN ({','.join('?' * len(tags))})
+                    )
+                    """,
+                    [chat_id, *tags]
+                )
+                candidates = self._candidates(tags, chat_id)
+            if not candidates:
+                return None
+
+            weights = [matches * (1.0 + popularity) for _, matches, popularity in candidates]
+            track_id = random.choices([row[0] for row in candidates], weights=weights)[0]
+            if chat_id is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO chat_plays (chat_id, track_id, played_at) VALUES (?, ?, ?)",
+                    (chat_id, track_id, time.time())
+                )
+            row = self._db.execute(
+                "SELECT id, name, artist, album, release_date, duration, stream_url FROM tracks WHERE id = ?",
+                (track_id,)
+            ).fetchone()
+
+        return {
+            "id": row[0],
+            "title": row[1],
+            "artist": row[2],
+            "album": row[3] or "Unknown Album",
+            "release_date": row[4],
+            "duration": row[5],
+            "genre": "+".join(tags),
+            "stream_url": row[6]
+        }
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            tracks = self._db.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+            tags = dict(self._db.execute("SELECT tag, track_count FROM tag_refresh").fetchall())
+        return {"tracks": tracks, "tags": tags}
+
+    def _candidates(self, tags: List[str], chat_id: Optional[str]):
+        placeholders = ','.join('?' * len(tags))
+        return self._db.execute(
+            f"""
+            SELECT t.id, COUNT(*) AS matches, t.popularity
+            FROM track_tags tt JOIN tracks t ON t.id = tt.track_id
+            WHERE tt.tag IN ({placeholders})
+              AND NOT EXISTS (SELECT 1 FROM chat_plays p WHERE p.chat_id = ? AND p.track_id = t.id)
+            GROUP BY t.id
+            ORDER BY matches DESC, t.popularity DESC
+            LIMIT ?
+            """,
+            [*tags, chat_id, self.candidate_limit]
+        ).fetchall()
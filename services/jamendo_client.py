@@ -1,21 +1,112 @@
+import asyncio
+import hashlib
 import os
-from typing import List
+from typing import List, Optional, Tuple
 
-import requests
+import httpx
 from dotenv import load_dotenv
 from datetime import datetime
 from models.SoundFragment import SoundFragment
+from services.http_client import CircuitOpenError, get_http_client
+from services.jamendo_catalog import JamendoCatalog
+from services.track_downloader import TrackDownloader
 from utils.logger import logger
 
 load_dotenv()
 
 
 class JamendoAPIClient:
-    def __init__(self):
+    def __init__(self, catalog: JamendoCatalog = None, downloader: TrackDownloader = None):
         self.client_id = os.getenv("JAMENDO_CLIENT_ID")
         self.api_base_url = "https://api.jamendo.com/v3.0"
+        self.catalog = catalog or JamendoCatalog()
+        self.downloader = downloader or TrackDownloader()
+        self.prefetch_genres = JamendoCatalog.normalize_tags(
+            os.getenv("JAMENDO_PREFETCH_GENRES", "rock,pop,electronic,house,jazz,hiphop,classical,ambient").split(",")
+        )
+        self.page_size = int(os.getenv("JAMENDO_PAGE_SIZE", 200))
+        self.max_pages = int(os.getenv("JAMENDO_PREFETCH_MAX_PAGES", 5))
+        self.refresh_interval = float(os.getenv("JAMENDO_REFRESH_INTERVAL", 6 * 3600))
+        self.refresh_check_interval = float(os.getenv("JAMENDO_REFRESH_CHECK_INTERVAL", 300))
+        self._refresh_task = None
+        self._prefetching = {}
 
-    def fetch_metadata_by_genre(self, genres:  List[str]):
+    def start_prefetch(self):
+        """Start the background task that keeps the local catalog filled and fresh"""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop_prefetch(self):
+        tasks = [task for task in [self._refresh_task, *self._prefetching.values()] if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refresh_task = None
+        self._prefetching.clear()
+
+    async def prefetch_genre(self, genre: str) -> int:
+        """Page through Jamendo results for genre into the catalog.
+
+        A genre seen for the first time is filled with its most popular tracks;
+        later refreshes walk the newest releases and stop at the first page that
+        brings nothing new.
+        """
+        initial = not await asyncio.to_thread(self.catalog.has_tag, genre)
+        order = "popularity_total" if initial else "releasedate_desc"
+        added = 0
+
+        for page in range(self.max_pages):
+            tracks = await self.fetch_tracks_page(genre, page * self.page_size, order)
+            if tracks is None:
+                break
+            new_tracks = await asyncio.to_thread(self.catalog.add_tracks, genre, tracks)
+            added += new_tracks
+            if len(tracks) < self.page_size or (not initial and new_tracks == 0):
+                break
+
+        await asyncio.to_thread(self.catalog.mark_refreshed, genre)
+        logger.info(f"Jamendo catalog refreshed for '{genre}': {added} new tracks")
+        return added
+
+    async def fetch_tracks_page(self, genre: str, offset: int, order: str) -> Optional[List[dict]]:
+        params = {
+            "client_id": self.client_id,
+            "format": "json",
+            "fuzzytags": genre,
+            "limit": self.page_size,
+            "offset": offset,
+            "order": order,
+            "include": "musicinfo stats",
+            "audioformat": "mp32"
+        }
+
+        try:
+            response = await get_http_client().request('GET', f"{self.api_base_url}/tracks", params=params)
+            if response.status_code != 200:
+                logger.error(f"Error fetching Jamendo page for '{genre}': {response.status_code}")
+                return None
+            results = response.json().get("results", [])
+        except (httpx.HTTPError, CircuitOpenError, ValueError) as e:
+            logger.error(f"Error fetching Jamendo page for '{genre}': {e}")
+            return None
+
+        return [
+            {
+                "id": str(track["id"]),
+                "name": track["name"],
+                "artist": track["artist_name"],
+                "album": track.get("album_name"),
+                "release_date": track.get("releasedate"),
+                "duration": track.get("duration"),
+                "stream_url": track["audio"],
+                "popularity": float((track.get("stats") or {}).get("popularity_total") or 0),
+                "tags": ((track.get("musicinfo") or {}).get("tags") or {}).get("genres", [])
+            }
+            for track in results
+            if track.get("audio")
+        ]
+
+    async def fetch_metadata_by_genre(self, genres:  List[str]):
         url = f"{self.api_base_url}/tracks"
         genre_string = "+".join(genres)
         params = {
@@ -26,13 +117,14 @@ class JamendoAPIClient:
         }
 
         try:
-            response = requests.get(url, params=params)
+            response = await get_http_client().request('GET', url, params=params)
             logger.info(f"Fetching metadata for genre: {genre_string}")
             if response.status_code == 200:
                 data = response.json()
                 if data.get("results"):
                     track = data["results"][0]
                     metadata = {
+                        "id": str(track["id"]),
                         "title": track["name"],
                         "artist": track["artist_name"],
                         "album": track.get("album_name", "Unknown Album"),
@@ -49,22 +141,35 @@ class JamendoAPIClient:
             else:
                 logger.error(f"Error fetching metadata: {response.status_code}, {response.text}")
                 return None
-        except requests.RequestException as e:
+        except (httpx.HTTPError, CircuitOpenError) as e:
             logger.error(f"Error fetching track metadata from Jamendo: {e}")
             return None
 
-    def get_sound_fragment(self, genres:  List[str]):
-        metadata = self.fetch_metadata_by_genre(genres)
+    async def select_track(self, genres: List[str], chat_id: str = None) -> Optional[dict]:
+        """Pick a track from the local catalog, falling back to a live query on a miss"""
+        metadata = await asyncio.to_thread(self.catalog.select_track, genres, chat_id)
         if metadata:
-            response = requests.get(metadata["stream_url"], stream=True)
-            response.raise_for_status()
+            return metadata
 
-            blob_name = f"{metadata['artist']}_{metadata['title']}.mp3"
-            #file_uri = self.upload_to_gcs(response.content, blob_name)
+        for genre in JamendoCatalog.normalize_tags(genres):
+            await asyncio.to_thread(self.catalog.track_tag, genre)
+            self._prefetch_once(genre)
+        logger.info(f"Jamendo catalog has no tracks for {genres}, querying the API")
+        return await self.fetch_metadata_by_genre(genres)
+
+    async def get_sound_fragment(self, genres:  List[str], chat_id: str = None) -> Optional[Tuple[SoundFragment, str]]:
+        """Pick and download a track; returns the fragment, whose fileUri is the public stream URL, and the local path"""
+        metadata = await self.select_track(genres, chat_id)
+        if metadata:
+            track_id = metadata.get("id") or hashlib.sha256(metadata["stream_url"].encode()).hexdigest()[:16]
+            download = await self.downloader.download(metadata["stream_url"], f"jamendo-{track_id}.mp3")
+            if download is None:
+                logger.warning(f"Could not download track '{metadata['title']}'")
+                return None
 
             fragment = SoundFragment(
                 source="JAMENDO",
-                fileUri="",#file_uri,
+                fileUri=metadata["stream_url"],
                 type="SONG",
                 author=metadata["artist"],
                 name=metadata["title"],
@@ -73,14 +178,37 @@ class JamendoAPIClient:
                 album=metadata["album"]
             )
             logger.info(f"Created SoundFragment for track '{metadata['title']}' source '{fragment.source}'")
-            return fragment
+            return fragment, download.path
         else:
             logger.warning(f"Could not create SoundFragment for genre: {genres}")
             return None
 
+    def _prefetch_once(self, genre: str) -> Optional[asyncio.Task]:
+        """Start prefetching genre unless a refresh or a catalog miss is already fetching it"""
+        if genre in self._prefetching:
+            return None
+        task = asyncio.create_task(self.prefetch_genre(genre))
+        self._prefetching[genre] = task
+        task.add_done_callback(lambda _, genre=genre: self._prefetching.pop(genre, None))
+        return task
+
+    async def _refresh_loop(self):
+        for genre in self.prefetch_genres:
+            await asyncio.to_thread(self.catalog.track_tag, genre)
+        while True:
+            for genre in await asyncio.to_thread(self.catalog.stale_tags, self.refresh_interval):
+                task = self._prefetch_once(genre)
+                if task is None:
+                    continue
+                try:
+                    await task
+                except Exception as e:
+                    logger.error(f"Jamendo catalog refresh failed for '{genre}': {e}")
+            await asyncio.sleep(self.refresh_check_interval)
+
 
 if __name__ == "__main__":
     jamendo_client = JamendoAPIClient()
-    sound_fragment = jamendo_client.get_sound_fragment(["house", "edm"])
+    sound_fragment = asyncio.run(jamendo_client.get_sound_fragment(["house", "edm"]))
     if sound_fragment:
-        logger.info(sound_fragment)
+        logger.info(sound_fragment[0])
@@ -0,0 +1,32 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from google.cloud import pubsub_v1
+
+from models.SoundFragment import SoundFragment
+from utils.logger import logger
+
+
+class SoundFragmentPublisher:
+    def __init__(self):
+        load_dotenv()
+        self.topic = os.getenv("PUBSUB_TOPIC")
+        project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+        if self.topic and project_id and not self.topic.startswith("projects/"):
+            self.topic = pubsub_v1.PublisherClient.topic_path(project_id, self.topic)
+        self.timeout = float(os.getenv("PUBSUB_TIMEOUT", 30))
+        # Created on first publish so the bot starts without Pub/Sub credentials
+        self.client = None
+
+    async def publish(self, fragment: SoundFragment) -> str:
+        """Publish fragment as JSON and return the Pub/Sub message id"""
+        if not self.topic:
+            raise RuntimeError("PUBSUB_TOPIC is not configured")
+        if self.client is None:
+            self.client = pubsub_v1.PublisherClient()
+
+        future = self.client.publish(self.topic, fragment.to_json().encode("utf-8"), source=fragment.source)
+        message_id = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        logger.info(f"Published sound fragment '{fragment.name}' to {self.topic} as {message_id}")
+        return message_id
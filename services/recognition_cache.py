@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.file_processor import LocalAudioProcessor
+from utils.logger import logger
+
+load_dotenv()
+
+SAMPLE_RATE = 11025
+_WINDOW = 2048
+_HOP = 1024
+# Frequency bands (FFT bins) in which the strongest peak of every frame is taken
+_BANDS = [(10, 40), (40, 80), (80, 160), (160, 320), (320, 640), (640, 1023)]
+_PEAK_THRESHOLD = 0.5
+_FAN_OUT = 3
+_MAX_DT = 63
+
+
+def compute_fingerprint(pcm: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return landmark hashes and their frame offsets for mono PCM at SAMPLE_RATE.
+
+    Each hash packs the frequencies of two spectral peaks and the number of frames
+    between them, which survives re-encoding, volume changes and cropping.
+    """
+    if len(pcm) < _WINDOW:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    frames = np.lib.stride_tricks.sliding_window_view(pcm, _WINDOW)[::_HOP]
+    spectrum = np.log1p(np.abs(np.fft.rfft(frames * np.hanning(_WINDOW), axis=1)))
+
+    peak_times, peak_freqs = [], []
+    for low, high in _BANDS:
+        band = spectrum[:, low:high]
+        strongest = band.argmax(axis=1)
+        magnitude = band[np.arange(len(band)), strongest]
+        keep = magnitude > magnitude.mean() + _PEAK_THRESHOLD * magnitude.std()
+        peak_times.append(np.nonzero(keep)[0])
+        peak_freqs.append(strongest[keep] + low)
+
+    times = np.concatenate(peak_times).astype(np.int64)
+    freqs = np.concatenate(peak_freqs).astype(np.int64)
+    order = np.lexsort((freqs, times))
+    times, freqs = times[order], freqs[order]
+
+    hashes, offsets = [], []
+    for step in range(1, _FAN_OUT + 1):
+        dt = times[step:] - times[:-step]
+        valid = (dt > 0) & (dt <= _MAX_DT)
+        hashes.append((freqs[:-step][valid] << 18) | (freqs[step:][valid] << 8) | dt[valid])
+        offsets.append(times[:-step][valid])
+    return np.concatenate(hashes), np.concatenate(offsets)
+
+
+class FingerprintIndex:
+    """SQLite-backed index of landmark hashes for recognized tracks"""
+
+    def __init__(self, db_path: str = None, max_tracks: int = None, min_matches: int = None):
+        self.db_path = db_path or os.getenv("RECOGNITION_CACHE_DB", os.path.join(".cache", "recognition.sqlite3"))
+        self.max_tracks = max_tracks or int(os.getenv("RECOGNITION_CACHE_MAX_TRACKS", 5000))
+        self.min_matches = min_matches or int(os.getenv("RECOGNITION_CACHE_MIN_MATCHES", 20))
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS tracks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content_hash TEXT UNIQUE,
+                metadata TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                hash INTEGER NOT NULL,
+                track_id INTEGER NOT NULL,
+                frame INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_fingerprints_hash ON fingerprints (hash);
+            CREATE INDEX IF NOT EXISTS idx_fingerprints_track ON fingerprints (track_id);
+        """)
+
+    def find_by_content(self, content_hash: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT metadata FROM tracks WHERE content_hash = ?", (content_hash,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def match(self, hashes: np.ndarray, offsets: np.ndarray) -> Optional[dict]:
+        query_offsets = {}
+        for fingerprint_hash, offset in zip(hashes.tolist(), offsets.tolist()):
+            query_offsets.setdefault(fingerprint_hash, []).append(offset)
+
+        votes = Counter()
+        unique_hashes = list(query_offsets)
+        with self._lock:
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT hash, track_id, frame FROM fingerprints WHERE hash IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+                for fingerprint_hash, track_id, offset in rows:
+                    for query_offset in query_offsets[fingerprint_hash]:
+                        votes[(track_id, offset - query_offset)] += 1
+
+            if not votes:
+                return None
+            (track_id, _), count = votes.most_common(1)[0]
+            if count < self.min_matches:
+                return None
+            row = self._db.execute("SELECT metadata FROM tracks WHERE id = ?", (track_id,)).fetchone()
+
+        logger.debug(f"Fingerprint match on track {track_id} with {count} aligned hashes")
+        return json.loads(row[0]) if row else None
+
+    def add(self, metadata: dict, content_hash: str, hashes: np.ndarray, offsets: np.ndarray):
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT OR REPLACE INTO tracks (content_hash, metadata, created_at) VALUES (?, ?, ?)",
+                (content_hash, json.dumps(metadata), time.time())
+            )
+            track_id = cursor.lastrowid
+            self._db.executemany(
+                "INSERT INTO fingerprints (hash, track_id, frame) VALUES (?, ?, ?)",
+                zip(hashes.tolist(), [track_id] * len(hashes), offsets.tolist())
+            )
+            self._evict()
+
+    def remember_content(self, content_hash: str, metadata: dict):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO tracks (content_hash, metadata, created_at) VALUES (?, ?, ?)",
+                (content_hash, json.dumps(metadata), time.time())
+            )
+            self._evict()
+
+    def _evict(self):
+        stale = self._db.execute(
+            "SELECT id FROM tracks ORDER BY created_at DESC LIMIT -1 OFFSET ?", (self.max_tracks,)
+        ).fetchall()
+        for (track_id,) in stale:
+            self._db.execute("DELETE FROM fingerprints WHERE track_id = ?", (track_id,))
+            self._db.execute("DELETE FROM tracks WHERE id = ?", (track_id,))
+
+
+class RecognitionCache:
+    """Answers detect_song from the local index and falls back to the remote client on a miss"""
+
+    def __init__(self, client, audio_processor: LocalAudioProcessor = None, index: FingerprintIndex = None):
+        self.client = client
+        self.audio_processor = audio_processor or LocalAudioProcessor()
+        self.index = index or FingerprintIndex()
+        self.max_seconds = float(os.getenv("RECOGNITION_FINGERPRINT_SECONDS", 60))
+        self.stats = {"content_hits": 0, "fingerprint_hits": 0, "misses": 0}
+
+    async def detect_song(self, file_data: bytes) -> Optional[dict]:
+        started = time.monotonic()
+        # Hashing a whole track and every SQLite call run off the event loop
+        content_hash = await asyncio.to_thread(lambda: hashlib.sha256(file_data).hexdigest())
+
+        metadata = await asyncio.to_thread(self.index.find_by_content, content_hash)
+        if metadata:
+            self.stats["content_hits"] += 1
+            logger.info(f"Recognition cache hit (content) in {(time.monotonic() - started) * 1000:.1f} ms")
+            return metadata
+
+        hashes = offsets = None
+        try:
+            pcm = await self.audio_processor.decode_pcm(file_data, SAMPLE_RATE, self.max_seconds)
+            if pcm:
+                hashes, offsets = await asyncio.to_thread(
+                    lambda: compute_fingerprint(np.frombuffer(pcm, dtype=np.int16).astype(np.float32))
+                )
+                metadata = await asyncio.to_thread(self.index.match, hashes, offsets)
+        except Exception as e:
+            # A failed local fingerprint is a cache miss, the remote providers still answer
+            logger.warning(f"Local fingerprinting failed: {e!r}")
+            hashes = offsets = metadata = None
+        if metadata:
+            self.stats["fingerprint_hits"] += 1
+            await asyncio.to_thread(self.index.remember_content, content_hash, metadata)
+            logger.info(f"Recognition cache hit (fingerprint) in {(time.monotonic() - started) * 1000:.1f} ms")
+            return metadata
+
+        self.stats["misses"] += 1
+        metadata = await self.client.detect_song(file_data)
+        if metadata and hashes is not None and len(hashes):
+            await asyncio.to_thread(self.index.add, metadata, content_hash, hashes, offsets)
+        elif metadata:
+            await asyncio.to_thread(self.index.remember_content, content_hash, metadata)
+        return metadata
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+from utils.mp3 import sample_windows
+
+load_dotenv()
+
+
+class _ProviderStats:
+    def __init__(self):
+        self.latencies = deque(maxlen=100)
+        self.attempts = 0
+        self.successes = 0
+
+    def record(self, latency: float, success: bool):
+        self.latencies.append(latency)
+        self.attempts += 1
+        self.successes += int(success)
+
+    @property
+    def success_rate(self) -> float:
+        # Laplace smoothing keeps a provider with few samples from being ranked first or last too early
+        return (self.successes + 1) / (self.attempts + 2)
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < 10:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[int(len(latencies) * 0.95)]
+
+
+class RecognitionRouter:
+    """Queries several recognition providers and returns the first confident result.
+
+    In "hedged" mode the best-ranked provider is asked first and the next one is
+    started once the first has been running for its p95 latency; in "race" mode all
+    providers start at once. Providers still running when a winner is found are
+    cancelled. Ranking adapts to observed success rate and latency. The sample
+    windows are cut once per request and shared by every provider.
+    """
+
+    def __init__(self, providers: Dict[str, object], mode: str = None):
+        self.providers = providers
+        self.mode = mode or os.getenv("RECOGNITION_MODE", "hedged")
+        self.default_hedge_delay = float(os.getenv("RECOGNITION_HEDGE_DELAY", 3))
+        self.timeout = float(os.getenv("RECOGNITION_TIMEOUT", 30))
+        self.sample_seconds = float(os.getenv("RECOGNITION_SAMPLE_SECONDS", 15))
+        self.sample_window_count = int(os.getenv("RECOGNITION_SAMPLE_WINDOWS", 1))
+        self.stats = {name: _ProviderStats() for name in providers}
+
+    async def detect_song(self, file_data: bytes) -> Optional[dict]:
+        samples = await asyncio.to_thread(sample_windows, file_data, self.sample_seconds, self.sample_window_count)
+        queue = self._ranked_providers()
+        deadline = time.monotonic() + self.timeout
+        pending = set()
+        last_launched = None
+
+        try:
+            while True:
+                if queue and (not pending or self.mode == "race"):
+                    while queue:
+                        last_launched = queue.pop(0)
+                        pending.add(asyncio.create_task(self._call(last_launched, samples)))
+                        if self.mode != "race":
+                            break
+                if not pending:
+                    return None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("Song recognition timed out")
+                    return None
+
+                wait = min(remaining, self._hedge_delay(last_launched)) if queue else remaining
+                done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name, result = task.result()
+                    if self._is_confident(result):
+                        logger.info(f"Song recognized by {name}")
+                        return result
+
+                if not done and queue:
+                    last_launched = queue.pop(0)
+                    logger.info(f"Hedging song recognition with {last_launched}")
+                    pending.add(asyncio.create_task(self._call(last_launched, samples)))
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get_stats(self) -> dict:
+        return {
+            name: {
+                "attempts": stats.attempts,
+                "successes": stats.successes,
+                "p95_latency": stats.p95()
+            }
+            for name, stats in self.stats.items()
+        }
+
+    async def _call(self, name: str, samples: List):
+        started = time.monotonic()
+        try:
+            result = await self.providers[name].recognize_samples(samples)
+        except Exception as e:
+            logger.error(f"Recognition provider {name} failed: {e}")
+            result = None
+        self.stats[name].record(time.monotonic() - started, self._is_confident(result))
+        return name, result
+
+    def _ranked_providers(self) -> List[str]:
+        def rank(name: str):
+            stats = self.stats[name]
+            p95 = stats.p95()
+            return -stats.success_rate, p95 if p95 is not None else self.default_hedge_delay
+        return sorted(self.providers, key=rank)
+
+    def _hedge_delay(self, name: str) -> float:
+        p95 = self.stats[name].p95()
+        return p95 if p95 is not None else self.default_hedge_delay
+
+    @staticmethod
+    def _is_confident(result: Optional[dict]) -> bool:
+        return bool(result and result.get('title') and result.get('artist'))
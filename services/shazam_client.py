@@ -1,11 +1,12 @@
 import asyncio
 import os
-from typing import Optional
+from typing import List, Optional
 
-import requests
 from dotenv import load_dotenv
 
+from services.http_client import get_http_client
 from utils.logger import logger
+from utils.mp3 import sample_windows
 
 load_dotenv()
 
@@ -13,14 +14,10 @@ load_dotenv()
 class ShazamAPIClient:
     def __init__(self):
         self.api_key = os.getenv("SHAZAM_API_KEY")
-        self.base_url = "https://shazam-api6.p.rapidapi.com/shazam/recognize/"
+        self.base_url = os.getenv("SHAZAM_API_URL", "https://shazam-api6.p.rapidapi.com/shazam/recognize/")
+        self.sample_seconds = float(os.getenv("RECOGNITION_SAMPLE_SECONDS", 15))
 
     async def detect_song(self, file_data: bytes) -> Optional[dict]:
-        headers = {
-            'x-rapidapi-host': 'shazam-api6.p.rapidapi.com',
-            'x-rapidapi-key': self.api_key
-        }
-
         try:
             # Debug input data
             logger.debug(f"Input file_data type: {type(file_data)}")
@@ -35,12 +32,29 @@ class ShazamAPIClient:
                     logger.error("Failed to convert hex string to bytes")
                     return None
 
+            samples = await asyncio.to_thread(sample_windows, file_data, self.sample_seconds)
+            return await self.recognize_samples(samples)
+
+        except Exception as e:
+            logger.error(f"Error with Shazam API: {e}")
+            return None
+
+    async def recognize_samples(self, samples: List) -> Optional[dict]:
+        """Recognize already cut sample windows; Shazam is sent the first one"""
+        headers = {
+            'x-rapidapi-host': 'shazam-api6.p.rapidapi.com',
+            'x-rapidapi-key': self.api_key
+        }
+
+        try:
+            sample = samples[0]
             files = {
-                "upload_file": ("audio.mp3", file_data, "audio/mpeg")
+                "upload_file": ("audio.mp3", bytes(sample), "audio/mpeg")
             }
 
-            logger.debug("Sending request to Shazam API...")
-            response = requests.post(
+            logger.debug(f"Sending {len(sample)} bytes to Shazam API...")
+            response = await get_http_client().request(
+                'POST',
                 self.base_url,
                 headers=headers,
                 files=files
@@ -49,10 +63,33 @@ class ShazamAPIClient:
             logger.debug(f"Response headers: {response.headers}")
             logger.debug(f"Response content: {response.text[:200]}...")
 
+            if response.status_code == 200:
+                return self._parse_track(response.json())
+            return None
+
         except Exception as e:
             logger.error(f"Error with Shazam API: {e}")
             return None
 
+    @staticmethod
+    def _parse_track(result: dict) -> Optional[dict]:
+        track = (result.get('result') or {}).get('track') or result.get('track')
+        if not track or not track.get('title'):
+            return None
+
+        section_metadata = {}
+        for section in track.get('sections', []):
+            for item in section.get('metadata', []):
+                section_metadata[item.get('title')] = item.get('text', '')
+
+        return {
+            'title': track['title'],
+            'artist': track.get('subtitle', ''),
+            'album': section_metadata.get('Album', ''),
+            'release_date': section_metadata.get('Released', ''),
+            'genre': (track.get('genres') or {}).get('primary', '')
+        }
+
 
 if __name__ == "__main__":
     file_path = "C:/Users/justa/tmp/hits_of70_80_90/013.  Camaro's  -  Companero.mp3"
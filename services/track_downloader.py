@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from services.http_client import CircuitOpenError, get_http_client
+from utils.logger import logger
+
+load_dotenv()
+
+# Sidecar files: the SHA-256 of a finished download and the validator of a partial one
+_DIGEST_SUFFIX = ".sha256"
+_VALIDATOR_SUFFIX = ".validator"
+
+
+class DownloadError(Exception):
+    pass
+
+
+@dataclass
+class DownloadResult:
+    path: str
+    size: int
+    sha256: str
+
+
+class TrackDownloader:
+    """Streams remote audio to disk in fixed-size chunks.
+
+    Only one chunk per download is held in memory, the SHA-256 is computed while
+    writing and kept next to the file, interrupted downloads resume from the
+    partial file with a Range request guarded by If-Range, and the directory is
+    kept under a byte budget by removing the least recently used files, abandoned
+    partial downloads included. Disk IO runs in threads.
+    """
+
+    def __init__(self, download_dir: str = None, disk_budget: int = None, chunk_size: int = None,
+                 max_concurrent: int = None, attempts: int = None):
+        self.download_dir = download_dir or os.getenv("TRACK_DOWNLOAD_DIR", os.path.join(".cache", "tracks"))
+        self.disk_budget = disk_budget or int(os.getenv("TRACK_DOWNLOAD_DISK_BUDGET", 1024 * 1024 * 1024))
+        self.chunk_size = chunk_size or int(os.getenv("TRACK_DOWNLOAD_CHUNK_SIZE", 64 * 1024))
+        self.attempts = attempts or int(os.getenv("TRACK_DOWNLOAD_ATTEMPTS", 3))
+        self._limiter = asyncio.Semaphore(max_concurrent or int(os.getenv("TRACK_DOWNLOAD_CONCURRENCY", 8)))
+        self._inflight = {}
+        os.makedirs(self.download_dir, exist_ok=True)
+
+    async def download(self, url: str, name: str) -> Optional[DownloadResult]:
+        cached = await self.get_cached(name)
+        if cached:
+            return cached
+        path = os.path.join(self.download_dir, name)
+
+        # Parallel requests for the same track share one download
+        task = self._inflight.get(path)
+        if task is None:
+            task = asyncio.ensure_future(self._download(url, path))
+            self._inflight[path] = task
+            task.add_done_callback(lambda _: self._inflight.pop(path, None))
+        try:
+            return await asyncio.shield(task)
+        except DownloadError as e:
+            # Telegram file URLs carry the bot token, so downloads are logged by name
+            logger.error(f"Download of {name} failed: {e}")
+            return None
+
+    async def get_cached(self, name: str) -> Optional[DownloadResult]:
+        result = await asyncio.to_thread(self._read_cached, os.path.join(self.download_dir, name))
+        if result:
+            logger.debug(f"Track {name} already downloaded")
+        return result
+
+    def _read_cached(self, path: str) -> Optional[DownloadResult]:
+        try:
+            os.utime(path)
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        try:
+            with open(f"{path}{_DIGEST_SUFFIX}") as file:
+                sha256 = file.read().strip()
+        except FileNotFoundError:
+            # Downloaded before digests were stored: hash it once
+            sha256 = self._hash_file(path)
+            self._write_text(f"{path}{_DIGEST_SUFFIX}", sha256)
+        return DownloadResult(path, size, sha256)
+
+    async def _download(self, url: str, path: str) -> DownloadResult:
+        part_path = f"{path}.part"
+        async with self._limiter:
+            for attempt in range(1, self.attempts + 1):
+                try:
+                    result = await self._fetch(url, part_path)
+                except (httpx.HTTPError, OSError) as e:
+                    logger.warning(f"Download of {path} interrupted ({e}), attempt {attempt}/{self.attempts}")
+                    continue
+                except CircuitOpenError as e:
+                    raise DownloadError(str(e))
+
+                downloading = {f"{other}.part" for other in self._inflight}
+                await asyncio.to_thread(self._finish, part_path, path, result.sha256, downloading)
+                logger.info(f"Downloaded {result.size} bytes to {path}")
+                return DownloadResult(path, result.size, result.sha256)
+
+        raise DownloadError(f"gave up after {self.attempts} attempts")
+
+    async def _fetch(self, url: str, part_path: str) -> DownloadResult:
+        digest = hashlib.sha256()
+        offset = 0
+        validator = await asyncio.to_thread(self._read_text, f"{part_path}{_VALIDATOR_SUFFIX}")
+        # Without a validator the server cannot tell us the file changed, so a partial file is not trusted
+        if validator and os.path.exists(part_path):
+            offset = await asyncio.to_thread(self._feed_digest, part_path, digest)
+
+        # If-Range makes the server send the whole new file instead of a range of a file that changed
+        headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset else {}
+        async with get_http_client().stream('GET', url, headers=headers, follow_redirects=True) as response:
+            if response.status_code != 416 or not offset:
+                return await self._receive(response, part_path, digest, offset)
+            # Content-Range: bytes */<size> tells whether the partial file already holds the whole body
+            if self._range_total(response.headers.get("Content-Range")) == offset:
+                return DownloadResult(part_path, offset, digest.hexdigest())
+
+        logger.debug(f"Partial file {part_path} does not match the remote size, restarting")
+        await asyncio.to_thread(self._discard_part, part_path)
+        return await self._fetch(url, part_path)
+
+    async def _receive(self, response: httpx.Response, part_path: str, digest, offset: int) -> DownloadResult:
+        if response.status_code not in (200, 206):
+            raise DownloadError(f"unexpected status {response.status_code}")
+        if response.status_code == 200 and offset:
+            logger.debug(f"Server sent the whole file for {part_path}, restarting")
+            digest, offset = hashlib.sha256(), 0
+        if response.status_code == 200:
+            await asyncio.to_thread(self._write_validator, f"{part_path}{_VALIDATOR_SUFFIX}", response.headers)
+
+        expected = response.headers.get("Content-Length")
+        file = await asyncio.to_thread(self._open_part, part_path, offset)
+        try:
+            received = 0
+            async for chunk in response.aiter_bytes(self.chunk_size):
+                await asyncio.to_thread(file.write, chunk)
+                digest.update(chunk)
+                received += len(chunk)
+        finally:
+            await asyncio.to_thread(file.close)
+
+        if expected is not None and received != int(expected):
+            raise httpx.ReadError(f"received {received} of {expected} bytes")
+        return DownloadResult(part_path, offset + received, digest.hexdigest())
+
+    @staticmethod
+    def _range_total(content_range: Optional[str]) -> Optional[int]:
+        try:
+            return int(content_range.rsplit("/", 1)[1])
+        except (AttributeError, IndexError, ValueError):
+            return None
+
+    @staticmethod
+    def _discard_part(part_path: str):
+        TrackDownloader._remove_quietly(part_path)
+        TrackDownloader._remove_quietly(f"{part_path}{_VALIDATOR_SUFFIX}")
+
+    @staticmethod
+    def _open_part(part_path: str, offset: int):
+        file = open(part_path, 'r+b' if offset else 'wb')
+        file.seek(offset)
+        file.truncate()
+        return file
+
+    def _finish(self, part_path: str, path: str, sha256: str, downloading: set):
+        self._write_text(f"{path}{_DIGEST_SUFFIX}", sha256)
+        os.replace(part_path, path)
+        self._remove_quietly(f"{part_path}{_VALIDATOR_SUFFIX}")
+        self._evict_over_budget(keep=path, downloading=downloading)
+
+    @staticmethod
+    def _write_validator(validator_path: str, headers):
+        # Weak ETags cannot be used with If-Range
+        etag = headers.get("ETag")
+        validator = etag if etag and not etag.startswith("W/") else headers.get("Last-Modified")
+        if validator:
+            TrackDownloader._write_text(validator_path, validator)
+        else:
+            TrackDownloader._remove_quietly(validator_path)
+
+    @staticmethod
+    def _read_text(path: str) -> Optional[str]:
+        try:
+            with open(path) as file:
+                return file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _write_text(path: str, text: str):
+        with open(path, 'w') as file:
+            file.write(text)
+
+    @staticmethod
+    def _remove_quietly(path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _hash_file(self, path: str) -> str:
+        digest = hashlib.sha256()
+        self._feed_digest(path, digest)
+        return digest.hexdigest()
+
+    def _feed_digest(self, path: str, digest) -> int:
+        size = 0
+        with open(path, 'rb') as file:
+            while chunk := file.read(self.chunk_size):
+                digest.update(chunk)
+                size += len(chunk)
+        return size
+
+    def _evict_over_budget(self, keep: str, downloading: set):
+        # Partial files count against the budget; those of abandoned downloads are evicted like tracks
+        entries = []
+        for filename in os.listdir(self.download_dir):
+            if filename.endswith((_DIGEST_SUFFIX, _VALIDATOR_SUFFIX)):
+                continue
+            file_path = os.path.join(self.download_dir, filename)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, file_path, stat.st_size))
+
+        total = sum(size for _, _, size in entries)
+        for _, file_path, size in sorted(entries):
+            if total <= self.disk_budget:
+                return
+            if file_path == keep or file_path in downloading:
+                continue
+            try:
+                os.unlink(file_path)
+                self._remove_quietly(f"{file_path}{_DIGEST_SUFFIX}")
+                self._remove_quietly(f"{file_path}{_VALIDATOR_SUFFIX}")
+                total -= size
+                logger.debug(f"Evicted downloaded track {file_path}")
+            except OSError as e:
+                logger.warning(f"Could not remove downloaded track {file_path}: {e}")
+
+
+if __name__ == "__main__":
+    import resource
+    import shutil
+    import sys
+    import tempfile
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    # Benchmark: 32 parallel 20 MB downloads from a local server, streamed to disk vs buffered in memory
+    track_count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    track = os.urandom(1024 * 1024) * 20
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(track)))
+            self.end_headers()
+            view = memoryview(track)
+            for start in range(0, len(view), 256 * 1024):
+                self.wfile.write(view[start:start + 256 * 1024])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/track.mp3"
+    download_dir = tempfile.mkdtemp(prefix="kneo_download_bench_")
+
+    def max_rss_mb():
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    async def streamed():
+        downloader = TrackDownloader(download_dir=download_dir, max_concurrent=track_count)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(downloader.download(url, f"{i}.mp3") for i in range(track_count)))
+        elapsed = time.perf_counter() - started
+        assert all(result.sha256 == hashlib.sha256(track).hexdigest() for result in results)
+        print(f"Streamed: {elapsed:.2f}s, max RSS {max_rss_mb():.1f} MB")
+
+    async def buffered():
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(get_http_client().request('GET', url) for _ in range(track_count)))
+        elapsed = time.perf_counter() - started
+        print(f"Buffered: {elapsed:.2f}s, {sum(len(r.content) for r in responses) // (1024 * 1024)} MB held, "
+              f"max RSS {max_rss_mb():.1f} MB")
+
+    async def main():
+        await streamed()
+        await buffered()
+        await get_http_client().close()
+
+    print(f"Baseline max RSS {max_rss_mb():.1f} MB")
+    asyncio.run(main())
+    server.shutdown()
+    shutil.rmtree(download_dir, ignore_errors=True)
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from utils.logger import logger
+
+load_dotenv()
+
+
+class TTSCache:
+    """Content-addressed cache for synthesized speech.
+
+    Audio is looked up in an in-memory LRU tier, then in an on-disk tier bounded by
+    size, and only synthesized on a miss. Concurrent misses for the same key share
+    one synthesis.
+    """
+
+    def __init__(self, memory_budget: int = None, disk_budget: int = None, cache_dir: str = None):
+        self.memory_budget = memory_budget or int(os.getenv("TTS_CACHE_MEMORY_BUDGET", 32 * 1024 * 1024))
+        self.disk_budget = disk_budget or int(os.getenv("TTS_CACHE_DISK_BUDGET", 512 * 1024 * 1024))
+        self.cache_dir = cache_dir or os.getenv("TTS_CACHE_DIR", os.path.join(".cache", "tts"))
+        self.stats_interval = int(os.getenv("TTS_CACHE_STATS_INTERVAL", 100))
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._disk_lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "coalesced": 0, "misses": 0}
+        self._synthesis_seconds = 0.0
+        self._load_disk_index()
+
+    @staticmethod
+    def make_key(text: str, voice_name: str, language_code: str, audio_config: dict) -> str:
+        payload = json.dumps([text, voice_name, language_code, audio_config], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get_or_create(self, key: str, create: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        data = self._get_memory(key)
+        if data is not None:
+            self._count("memory_hits")
+            return data
+        if key in self._disk:
+            data = await asyncio.to_thread(self._get_disk, key)
+            if data is not None:
+                self._put_memory(key, data)
+                self._count("disk_hits")
+                return data
+
+        # The synthesis belongs to the cache, so a cancelled caller does not cancel it for the others
+        task = self._inflight.get(key)
+        if task is None:
+            self._count("misses")
+            task = asyncio.ensure_future(self._create(key, create))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._count("coalesced")
+        return await asyncio.shield(task)
+
+    async def _create(self, key: str, create: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        started = time.monotonic()
+        data = await create()
+        self._synthesis_seconds += time.monotonic() - started
+        if data:
+            self._put_memory(key, data)
+            await asyncio.to_thread(self._put_disk, key, data)
+        return data
+
+    def get_stats(self) -> dict:
+        hits = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["coalesced"]
+        lookups = hits + self._stats["misses"]
+        average_synthesis = self._synthesis_seconds / self._stats["misses"] if self._stats["misses"] else 0.0
+        return {
+            **self._stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "saved_seconds": hits * average_synthesis,
+            "memory_bytes": self._memory_bytes,
+            "disk_bytes": self._disk_bytes
+        }
+
+    def _count(self, outcome: str):
+        self._stats[outcome] += 1
+        lookups = sum(self._stats.values())
+        if self.stats_interval and lookups % self.stats_interval == 0:
+            stats = self.get_stats()
+            logger.info(f"TTS cache after {lookups} lookups: hit rate {stats['hit_rate']:.0%}, "
+                        f"~{stats['saved_seconds']:.1f}s of synthesis saved, {stats}")
+
+    def _get_memory(self, key: str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            logger.debug(f"TTS cache memory hit {key[:12]}")
+        return data
+
+    def _get_disk(self, key: str) -> Optional[bytes]:
+        try:
+            path = self._path(key)
+            with open(path, 'rb') as file:
+                data = file.read()
+            os.utime(path)
+        except OSError as e:
+            logger.warning(f"TTS cache file for {key[:12]} is unreadable: {e}")
+            with self._disk_lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+
+        with self._disk_lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        logger.debug(f"TTS cache disk hit {key[:12]}")
+        return data
+
+    def _put_disk(self, key: str, data: bytes):
+        # Written to a temporary file and renamed, so a crash never leaves a truncated MP3 to be indexed
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not write TTS cache file for {key[:12]}: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.unlink(temp_path)
+            return
+
+        with self._disk_lock:
+            self._disk_bytes += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            evicted = []
+            while self._disk_bytes > self.disk_budget and len(self._disk) > 1:
+                evicted_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(evicted_key)
+        for evicted_key in evicted:
+            try:
+                os.unlink(self._path(evicted_key))
+            except OSError as e:
+                logger.warning(f"Could not remove TTS cache file for {evicted_key[:12]}: {e}")
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.memory_budget:
+            return
+        self._memory_bytes += len(data) - len(self._memory.pop(key, b""))
+        self._memory[key] = data
+        while self._memory_bytes > self.memory_budget:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def _load_disk_index(self):
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith('.mp3'):
+                stat = os.stat(os.path.join(self.cache_dir, filename))
+                entries.append((stat.st_mtime, filename[:-4], stat.st_size))
+            elif filename.endswith('.tmp'):
+                # Left behind by a write interrupted by a crash
+                os.unlink(os.path.join(self.cache_dir, filename))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        logger.debug(f"TTS cache loaded {len(self._disk)} entries ({self._disk_bytes} bytes) from disk")
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import http_client  # noqa: E402
+
+
+class StubServer:
+    """Local HTTP server answering every request through handle(method, path, body).
+
+    handle returns (status, payload) for a JSON reply, or (status, payload, content_type).
+    """
+
+    def __init__(self, handle):
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            wbufsize = 64 * 1024
+
+            def _reply(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.requests.append((self.command, self.path, body))
+                status, payload, *content_type = handle(self.command, self.path, body)
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type[0] if content_type else "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _reply
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def count(self, method: str = None, path: str = None) -> int:
+        return sum(1 for m, p, _ in self.requests if (method is None or m == method) and (path is None or p == path))
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(handle):
+        server = StubServer(handle)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_http_client():
+    # The shared pool binds to the event loop of the test that created it
+    http_client._shared_client = None
+    yield
+    http_client._shared_client = None
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine on a fresh loop and close the shared HTTP pool before the loop goes away"""
+    def run_coroutine(coroutine):
+        async def with_cleanup():
+            try:
+                return await coroutine
+            finally:
+                await http_client.get_http_client().close()
+        return asyncio.run(with_cleanup())
+    return run_coroutine
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ai import assistant as assistant_module
+from ai.tool_registry import ToolRegistry
+
+API_LATENCY = 0.2
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps({'type': event, **data})}\n\n"
+
+
+ANSWER = "".join([
+    sse("message_start", {"message": {
+        "id": "msg_1", "type": "message", "role": "assistant", "model": "stub", "content": [],
+        "stop_reason": None, "stop_sequence": None, "usage": {"input_tokens": 10, "output_tokens": 0}
+    }}),
+    sse("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}}),
+    sse("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": "Hello"}}),
+    sse("content_block_stop", {"index": 0}),
+    sse("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": 1}}),
+    sse("message_stop", {}),
+]).encode()
+
+
+class StubToolHandler:
+    def __init__(self):
+        self.registry = ToolRegistry({}, categories=["none"])
+        self.audio_store = None
+
+
+@pytest.fixture
+def messages_api(stub_server, monkeypatch, tmp_path):
+    def handle(method, path, body):
+        time.sleep(API_LATENCY)
+        return 200, ANSWER, "text/event-stream"
+
+    server = stub_server(handle)
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", server.url)
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    monkeypatch.setenv("AI_MODEL", "stub")
+    monkeypatch.setenv("TELEGRAM_FILE_ID_CACHE_DB", str(tmp_path / "files.sqlite3"))
+    monkeypatch.setenv("TELEGRAM_DOWNLOAD_DIR", str(tmp_path / "downloads"))
+    monkeypatch.setattr(assistant_module, "ToolHandler", StubToolHandler)
+    return server
+
+
+def serve_chats(run, chats: int) -> float:
+    async def scenario():
+        assistant = assistant_module.Assistant()
+        try:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(
+                assistant.handle_conversation(
+                    [{"role": "user", "content": "Hi"}],
+                    SimpleNamespace(_chat_id=chat, _user_id=chat, bot=None)
+                )
+                for chat in range(chats)
+            ))
+            elapsed = time.perf_counter() - started
+        finally:
+            await assistant.client.close()
+        assert [result.get_telegram_answer() for result in results] == ["Hello"] * chats
+        return elapsed
+
+    return run(scenario())
+
+
+def test_throughput_scales_with_concurrent_chats(messages_api, run, monkeypatch):
+    monkeypatch.setenv("AI_MAX_CONCURRENT_REQUESTS", "8")
+    single = serve_chats(run, 1)
+    concurrent = serve_chats(run, 8)
+
+    # Eight chats are answered in about the time of one, not eight times as long
+    assert concurrent < single + 3 * API_LATENCY
+    assert messages_api.count("POST") == 9
+
+
+def test_concurrency_limit_bounds_in_flight_requests(messages_api, run, monkeypatch):
+    monkeypatch.setenv("AI_MAX_CONCURRENT_REQUESTS", "2")
+    elapsed = serve_chats(run, 8)
+
+    # Four rounds of two requests
+    assert elapsed >= 4 * API_LATENCY
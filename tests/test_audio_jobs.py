@@ -0,0 +1,32 @@
+import asyncio
+import sys
+
+import pytest
+
+from services.audio_jobs import AudioJobError, AudioJobExecutor, AudioJobRejected, get_audio_job_executor
+from services.file_processor import LocalAudioProcessor
+
+
+def test_audio_processors_share_one_executor():
+    assert LocalAudioProcessor().jobs is LocalAudioProcessor().jobs is get_audio_job_executor()
+
+
+def test_metrics_count_job_outcomes(run):
+    executor = AudioJobExecutor(max_concurrent=1, max_queued=1)
+
+    async def scenario():
+        assert await executor.run([sys.executable, "-c", "print('ok')"]) == b"ok\n"
+        with pytest.raises(AudioJobError):
+            await executor.run([sys.executable, "-c", "raise SystemExit(1)"])
+
+        slow = [asyncio.ensure_future(executor.run([sys.executable, "-c", "import time; time.sleep(0.2)"]))
+                for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(AudioJobRejected):
+            await executor.run([sys.executable, "-c", "pass"])
+        await asyncio.gather(*slow)
+
+    run(scenario())
+    metrics = executor.get_metrics()
+    assert (metrics["completed"], metrics["failed"], metrics["rejected"]) == (3, 1, 1)
+    assert metrics["queue_depth"] == metrics["running"] == 0
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from services.audio_store import AudioBlobStore, AudioQuotaExceeded
+
+
+def test_entry_larger_than_the_disk_budget_is_rejected(tmp_path):
+    store = AudioBlobStore(memory_budget=10, disk_budget=50, user_quota=1000, spill_dir=str(tmp_path))
+    store.put("user", "small", b"x" * 40)
+
+    with pytest.raises(AudioQuotaExceeded):
+        store.put("user", "big", b"x" * 60)
+    assert bytes(store.get("user", "small")) == b"x" * 40
+    assert os.listdir(tmp_path) == [os.path.basename(store._entries[("user", "small")].path)]
+
+
+def test_new_entry_evicts_older_ones_but_not_itself(tmp_path):
+    store = AudioBlobStore(memory_budget=10, disk_budget=50, user_quota=1000, spill_dir=str(tmp_path))
+    store.put("user", "old", b"a" * 30)
+    store.put("user", "new", b"b" * 45)
+
+    assert store.get("user", "old") is None
+    assert bytes(store.get("user", "new")) == b"b" * 45
+    assert store.stats()["disk_bytes"] == 45
+
+
+def test_memory_over_budget_spills_least_recently_used(tmp_path):
+    store = AudioBlobStore(memory_budget=100, disk_budget=1000, user_quota=1000, spill_dir=str(tmp_path))
+    for key in ("a", "b", "c"):
+        store.put("user", key, key.encode() * 40)
+
+    assert store.stats()["memory_bytes"] == 80
+    assert store._entries[("user", "a")].path is not None
+    assert bytes(store.get("user", "a")) == b"a" * 40
+
+
+def test_private_spill_directory_is_removed_on_close():
+    store = AudioBlobStore(memory_budget=10)
+    store.put("user", "track", b"x" * 100)
+    spill_dir = store.spill_dir
+    assert os.listdir(spill_dir)
+
+    store.close()
+    assert not os.path.exists(spill_dir)
@@ -0,0 +1,31 @@
+from anthropic.types import TextBlock, ToolUseBlock
+
+from ai.conversation_store import NO_ANSWER, ConversationStore, final_answer_content
+
+
+def test_unanswered_tool_use_is_dropped():
+    content = [
+        TextBlock(type="text", text="Let me look that up"),
+        ToolUseBlock(type="tool_use", id="toolu_1", name="get_sound_fragment", input={"genres": ["jazz"]})
+    ]
+    assert final_answer_content(content) == [{"type": "text", "text": "Let me look that up"}]
+
+
+def test_empty_answer_gets_a_placeholder():
+    assert final_answer_content([]) == [{"type": "text", "text": NO_ANSWER}]
+    assert final_answer_content([{"type": "text", "text": "  "}]) == [{"type": "text", "text": NO_ANSWER}]
+    only_tool = [ToolUseBlock(type="tool_use", id="toolu_1", name="merge_audio", input={})]
+    assert final_answer_content(only_tool) == [{"type": "text", "text": NO_ANSWER}]
+
+
+def test_history_keeps_whole_turns_within_budget():
+    store = ConversationStore(token_budget=60)
+    for i in range(10):
+        store.add_turn("chat", [
+            {"role": "user", "content": f"question {i}"},
+            {"role": "assistant", "content": final_answer_content([{"type": "text", "text": f"answer {i}"}])}
+        ])
+    history = store.get_history("chat")
+    assert history[0]["role"] == "user"
+    assert history[-1]["content"] == [{"type": "text", "text": "answer 9"}]
+    assert len(history) % 2 == 0
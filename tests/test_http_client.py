@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from services.http_client import CircuitOpenError, HttpClient
+from services.MusicAPIClient import MusicAPIClient
+
+
+def make_client(**settings) -> HttpClient:
+    client = HttpClient()
+    client.backoff_base = 0.001
+    for name, value in settings.items():
+        setattr(client, name, value)
+    return client
+
+
+def test_idempotent_requests_are_retried_on_503(stub_server, run):
+    server = stub_server(lambda method, path, body: (503, {}) if len(server.requests) < 2 else (200, {}))
+    client = make_client()
+
+    async def scenario():
+        try:
+            return (await client.request("DELETE", f"{server.url}/queue/chat")).status_code
+        finally:
+            await client.close()
+
+    assert run(scenario()) == 200
+    assert server.count("DELETE") == 2
+
+
+def test_non_idempotent_requests_are_not_retried(stub_server, run):
+    server = stub_server(lambda method, path, body: (503, {}))
+    client = make_client()
+
+    async def scenario():
+        try:
+            return (await client.request("DELETE", f"{server.url}/queue/remove", idempotent=False)).status_code
+        finally:
+            await client.close()
+
+    assert run(scenario()) == 503
+    assert server.count("DELETE") == 1
+
+
+def test_queue_removal_by_index_is_sent_once(stub_server, monkeypatch, run):
+    server = stub_server(lambda method, path, body: (503, {}))
+    monkeypatch.setenv("API_BASE_URL", server.url)
+    monkeypatch.setenv("APP_NAME", "test")
+
+    async def scenario():
+        client = MusicAPIClient()
+        await client.remove_from_queue("chat", 3)
+        await client.remove_many_from_queue("chat", [1, 2])
+
+    run(scenario())
+    assert server.count("DELETE") == 2
+
+
+def test_half_open_breaker_lets_a_single_trial_through(stub_server, run):
+    state = {"healthy": False}
+
+    def handle(method, path, body):
+        if state["healthy"]:
+            time.sleep(0.05)
+            return 200, {}
+        return 500, {}
+
+    server = stub_server(handle)
+    client = make_client(retries=0, breaker_threshold=2, breaker_reset=0.05)
+
+    async def scenario():
+        url = f"{server.url}/status"
+        for _ in range(2):
+            await client.request("POST", url)
+        with pytest.raises(CircuitOpenError):
+            await client.request("POST", url)
+
+        await asyncio.sleep(0.06)
+        state["healthy"] = True
+        results = await asyncio.gather(*(client.request("POST", url) for _ in range(5)), return_exceptions=True)
+        # The breaker closes again after the successful trial
+        after = await client.request("POST", url)
+        await client.close()
+        return results, after
+
+    results, after = run(scenario())
+    assert sum(isinstance(result, httpx.Response) for result in results) == 1
+    assert sum(isinstance(result, CircuitOpenError) for result in results) == 4
+    assert after.status_code == 200
+
+
+def test_cancelled_trial_frees_the_half_open_slot(stub_server, run):
+    def handle(method, path, body):
+        time.sleep(0.2)
+        return 200, {}
+
+    server = stub_server(handle)
+    client = make_client(retries=0, breaker_threshold=1, breaker_reset=0)
+
+    async def scenario():
+        url = f"{server.url}/status"
+        client._host_state(url)[2].record_failure()
+        trial = asyncio.ensure_future(client.request("POST", url))
+        await asyncio.sleep(0.05)
+        trial.cancel()
+        await asyncio.gather(trial, return_exceptions=True)
+        response = await client.request("POST", url)
+        await client.close()
+        return response.status_code
+
+    assert run(scenario()) == 200
@@ -0,0 +1,47 @@
+from utils.mp3 import concat_streams, parse_mp3, sample_windows
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo, no padding: 417-byte frames
+HEADER = b"\xff\xfb\x90\x00"
+FRAME_LENGTH = 417
+
+
+def frames(count: int, fill: bytes = b"\x00") -> bytes:
+    return (HEADER + fill * (FRAME_LENGTH - len(HEADER))) * count
+
+
+def test_parses_back_to_back_frames():
+    stream = parse_mp3(frames(10))
+    assert len(stream.frames) == 10
+    assert stream.sample_rate == 44100
+
+
+def test_skips_junk_between_frames():
+    data = frames(5) + b"\xff\xfbjunk" + frames(5, b"\x11")
+    stream = parse_mp3(data)
+    assert len(stream.frames) == 10
+    assert concat_streams([stream]) == frames(5) + frames(5, b"\x11")
+
+
+def test_skips_a_header_like_run_of_junk():
+    # A valid, matching header with nothing behind it where its frame should end
+    data = frames(5) + HEADER + b"\x00" * 20 + frames(5, b"\x11")
+    stream = parse_mp3(data)
+    assert len(stream.frames) == 10
+    assert stream.frames[5].offset == 5 * FRAME_LENGTH + 24
+
+
+def test_skips_leading_garbage_and_id3_tag():
+    tag = b"ID3\x03\x00\x00\x00\x00\x00\x0a" + b"\xff\xfb" * 5
+    stream = parse_mp3(tag + b"\x00\xff\xe0garbage" + frames(4))
+    assert len(stream.frames) == 4
+
+
+def test_stops_at_a_different_stream():
+    # 48 kHz frames appended to a 44.1 kHz stream are not part of it
+    other = (b"\xff\xfb\x94\x00" + b"\x00" * 380) * 3
+    stream = parse_mp3(frames(3) + other)
+    assert len(stream.frames) == 3
+
+
+def test_non_mp3_data_is_sent_whole():
+    assert sample_windows(b"not audio", 15) == [b"not audio"]
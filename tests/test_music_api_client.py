@@ -0,0 +1,181 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from services.MusicAPIClient import MusicAPIClient, Track
+
+
+@pytest.fixture
+def music_api(stub_server, monkeypatch):
+    state = {"delay": 0.0, "playing": False}
+
+    def handle(method, path, body):
+        time.sleep(state["delay"])
+        if method == "GET" and path.endswith("/status"):
+            return 200, {"payload": {"isPlaying": state["playing"], "currentTrack": None, "queueLength": 0, "volume": 5}}
+        if method == "GET" and "/queue/" in path:
+            return 200, {"payload": {"queue": [{"title": "Song", "artist": "Artist", "url": "u"}]}}
+        if path.endswith("/pause") or path.endswith("/resume"):
+            state["playing"] = path.endswith("/resume")
+        return 200, {"payload": {}}
+
+    server = stub_server(handle)
+    monkeypatch.setenv("API_BASE_URL", server.url)
+    monkeypatch.setenv("APP_NAME", "test")
+    return server, state
+
+
+def test_status_is_cached_until_ttl(music_api, run):
+    server, _ = music_api
+
+    async def scenario():
+        client = MusicAPIClient()
+        client.state_ttl = 0.2
+        await client.get_player_status("chat")
+        await client.get_player_status("chat")
+        cached_reads = server.count("GET")
+        await asyncio.sleep(0.25)
+        await client.get_player_status("chat")
+        return cached_reads, server.count("GET")
+
+    assert run(scenario()) == (1, 2)
+
+
+def test_concurrent_reads_share_one_request(music_api, run):
+    server, state = music_api
+    state["delay"] = 0.1
+
+    async def scenario():
+        client = MusicAPIClient()
+        return await asyncio.gather(*(client.get_queue("chat") for _ in range(50)))
+
+    queues = run(scenario())
+    assert all(queue == [Track("Song", "Artist", "u")] for queue in queues)
+    assert server.count("GET") == 1
+
+
+def test_cancelled_reader_does_not_cancel_other_waiters(music_api, run):
+    _, state = music_api
+    state["delay"] = 0.1
+
+    async def scenario():
+        client = MusicAPIClient()
+        owner = asyncio.ensure_future(client.get_player_status("chat"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(client.get_player_status("chat"))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        return await waiter
+
+    assert run(scenario())["volume"] == 5
+
+
+def test_own_mutation_invalidates_status(music_api, run):
+    server, _ = music_api
+
+    async def scenario():
+        client = MusicAPIClient()
+        before = await client.get_player_status("chat")
+        await client.resume("chat")
+        after = await client.get_player_status("chat")
+        return before["isPlaying"], after["isPlaying"]
+
+    assert run(scenario()) == (False, True)
+    assert server.count("GET") == 2
+
+
+def test_push_update_is_served_without_a_request(music_api, run):
+    server, _ = music_api
+
+    async def scenario():
+        client = MusicAPIClient()
+        client.apply_push_update("chat", status={"isPlaying": True, "volume": 9})
+        return await client.get_player_status("chat")
+
+    assert run(scenario()) == {"isPlaying": True, "volume": 9}
+    assert server.count("GET") == 0
+
+
+def test_idle_chats_are_pruned(music_api, run):
+    async def scenario():
+        client = MusicAPIClient()
+        client.state_ttl = 0.01
+        client.state_prune_interval = 0
+        for chat in range(20):
+            await client.pause(f"chat{chat}")
+            await client.get_player_status(f"chat{chat}")
+        await asyncio.sleep(0.02)
+        await client.get_player_status("last")
+        return client
+
+    client = run(scenario())
+    assert set(chat for chat, _ in client._state_cache) == {"last"}
+    assert set(client._state_generation) <= {"last"}
+
+
+
+def test_adds_fall_back_to_single_requests_without_batch_endpoints(music_api, run):
+    server, _ = music_api
+
+    async def scenario():
+        client = MusicAPIClient()
+        tracks = [Track(f"Song {i}", "Artist", f"u{i}") for i in range(3)]
+        await client.add_many_to_queue("chat", tracks)
+        await client.save_favorites("user", tracks)
+        await client.remove_many_from_queue("chat", [0, 2])
+
+    run(scenario())
+    paths = [path.rsplit("/music/", 1)[1] for _, path, _ in server.requests]
+    assert paths == ["queue/add"] * 3 + ["favorites/add"] * 3 + ["queue/remove"] * 2
+    assert [json.loads(body)["index"] for _, path, body in server.requests if path.endswith("queue/remove")] == [2, 0]
+
+
+def test_concurrent_adds_share_one_batch_request(music_api, run, monkeypatch):
+    server, state = music_api
+    state["delay"] = 0.05
+    monkeypatch.setenv("MUSIC_API_BATCH_ENDPOINTS", "true")
+
+    async def scenario():
+        client = MusicAPIClient()
+        tracks = [Track(f"Song {i}", "Artist", f"u{i}") for i in range(20)]
+        await asyncio.gather(*(client.add_to_queue("chat", track) for track in tracks))
+        return client
+
+    client = run(scenario())
+    assert server.count("POST") == 1
+    assert len(json.loads(server.requests[0][2])["tracks"]) == 20
+    assert client._sending_adds == {} and client._pending_adds == {}
+
+
+def test_sequential_add_is_sent_without_waiting(music_api, run, monkeypatch):
+    server, _ = music_api
+    monkeypatch.setenv("MUSIC_API_BATCH_ENDPOINTS", "true")
+
+    async def scenario():
+        client = MusicAPIClient()
+        await client.get_player_status("warm up the connection")
+        started = time.perf_counter()
+        for i in range(5):
+            await client.add_to_queue("chat", Track(f"Song {i}", "Artist", f"u{i}"))
+        return time.perf_counter() - started
+
+    assert run(scenario()) < 0.05
+    assert server.count("POST", "/api/test/music/queue/add") == 5
+
+
+def test_adds_made_while_one_is_in_flight_follow_as_a_batch(music_api, run, monkeypatch):
+    server, state = music_api
+    state["delay"] = 0.05
+    monkeypatch.setenv("MUSIC_API_BATCH_ENDPOINTS", "true")
+
+    async def scenario():
+        client = MusicAPIClient()
+        first = asyncio.ensure_future(client.add_to_queue("chat", Track("First", "Artist", "u")))
+        await asyncio.sleep(0.01)
+        later = [client.add_to_queue("chat", Track(f"Song {i}", "Artist", f"u{i}")) for i in range(4)]
+        await asyncio.gather(first, *later)
+
+    run(scenario())
+    assert [path.rsplit("/", 1)[1] for _, path, _ in server.requests] == ["add", "add-batch"]
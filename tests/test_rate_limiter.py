@@ -0,0 +1,86 @@
+import asyncio
+import time
+from urllib.parse import parse_qs
+
+import pytest
+from telegram.ext import ExtBot
+
+from bot.rate_limiter import PriorityRateLimiter
+
+
+@pytest.fixture
+def bot_api(stub_server):
+    """Stub Bot API recording (method, chat_id, time) and answering 429 for the chats in rate_limited"""
+    calls, rate_limited = [], set()
+
+    def handle(method, path, body):
+        endpoint = path.rsplit("/", 1)[-1]
+        if endpoint == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Test", "username": "test_bot"}}
+
+        chat_id = int(parse_qs(body.decode()).get("chat_id", ["0"])[0])
+        calls.append((endpoint, chat_id, time.monotonic()))
+        if chat_id in rate_limited:
+            rate_limited.discard(chat_id)
+            return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                         "parameters": {"retry_after": 1}}
+        return 200, {"ok": True, "result": {"message_id": 1, "date": 0, "chat": {"id": chat_id, "type": "private"}}}
+
+    server = stub_server(handle)
+    return server, calls, rate_limited
+
+
+def with_bot(run, server, limiter: PriorityRateLimiter, scenario):
+    async def main():
+        async with ExtBot("1:test", base_url=f"{server.url}/bot", rate_limiter=limiter) as bot:
+            return await scenario(bot)
+
+    return run(main())
+
+
+def test_calls_of_one_chat_are_paced_while_other_chats_go_ahead(bot_api, run):
+    server, calls, _ = bot_api
+    limiter = PriorityRateLimiter(chat_rate=10, chat_burst=2)
+
+    async def scenario(bot):
+        await asyncio.gather(*(bot.send_message(1, f"reply {i}") for i in range(6)),
+                             *(bot.send_message(chat_id, "reply") for chat_id in range(2, 8)))
+
+    with_bot(run, server, limiter, scenario)
+    one_chat = [sent for _, chat_id, sent in calls if chat_id == 1]
+    other_chats = [sent for _, chat_id, sent in calls if chat_id != 1]
+    # A burst of two, then one call every 100 ms
+    assert one_chat[-1] - one_chat[0] >= 0.35
+    assert max(other_chats) - min(other_chats) < 0.2
+    assert limiter.stats == {"sent": 12, "retries": 0}
+
+
+def test_text_replies_go_before_audio_uploads(bot_api, run):
+    server, calls, _ = bot_api
+    limiter = PriorityRateLimiter(chat_rate=10, chat_burst=1)
+
+    async def scenario(bot):
+        await bot.send_message(1, "first")
+        # The chat is out of tokens, so all three wait and are released by lane
+        await asyncio.gather(bot.send_audio(1, "audio-file-id"), bot.send_message(1, "a"), bot.send_message(1, "b"))
+
+    with_bot(run, server, limiter, scenario)
+    assert [endpoint for endpoint, _, _ in calls] == ["sendMessage", "sendMessage", "sendMessage", "sendAudio"]
+
+
+def test_retry_after_pauses_the_chat_and_retries(bot_api, run):
+    server, calls, rate_limited = bot_api
+    rate_limited.add(1)
+    limiter = PriorityRateLimiter(chat_rate=10, chat_burst=3)
+
+    async def scenario(bot):
+        return await asyncio.gather(bot.send_message(1, "reply"), bot.send_message(2, "reply"))
+
+    with_bot(run, server, limiter, scenario)
+    attempts = [sent for _, chat_id, sent in calls if chat_id == 1]
+    other_chat = [sent for _, chat_id, sent in calls if chat_id == 2]
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.9
+    # Only the limited chat is paused
+    assert other_chat[0] - attempts[0] < 0.5
+    assert limiter.stats == {"sent": 3, "retries": 1}
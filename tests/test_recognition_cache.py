@@ -0,0 +1,57 @@
+import sys
+
+import pytest
+
+from services.audio_jobs import AudioJobExecutor
+from services.file_processor import LocalAudioProcessor
+from services.recognition_cache import FingerprintIndex, RecognitionCache
+
+SONG = {"title": "Song", "artist": "Artist"}
+
+
+class RemoteClient:
+    def __init__(self):
+        self.calls = 0
+
+    async def detect_song(self, file_data: bytes):
+        self.calls += 1
+        return SONG
+
+
+class SlowExecutor(AudioJobExecutor):
+    async def run(self, command: list, input_data=None, timeout: float = None) -> bytes:
+        return await super().run([sys.executable, "-c", "import time; time.sleep(5)"], input_data, timeout)
+
+
+def full_executor() -> AudioJobExecutor:
+    executor = AudioJobExecutor(max_queued=1)
+    executor._queued = 1
+    return executor
+
+
+def processor_with(ffmpeg_path: str = None, jobs: AudioJobExecutor = None) -> LocalAudioProcessor:
+    processor = LocalAudioProcessor(jobs or AudioJobExecutor())
+    if ffmpeg_path:
+        processor.ffmpeg_path = ffmpeg_path
+    return processor
+
+
+@pytest.mark.parametrize("make_processor", [
+    pytest.param(lambda: processor_with(ffmpeg_path="/nonexistent/ffmpeg"), id="ffmpeg-missing"),
+    pytest.param(lambda: processor_with(jobs=full_executor()), id="queue-full"),
+    pytest.param(lambda: processor_with(jobs=SlowExecutor(timeout=0.1)), id="timeout"),
+])
+def test_failed_local_fingerprint_falls_back_to_the_remote_client(make_processor, run, tmp_path):
+    async def scenario():
+        client = RemoteClient()
+        index = FingerprintIndex(db_path=str(tmp_path / "index.sqlite3"))
+        cache = RecognitionCache(client, make_processor(), index)
+        return await cache.detect_song(b"audio"), client.calls, cache.stats["misses"]
+
+    assert run(scenario()) == (SONG, 1, 1)
+
+
+def test_transcode_failure_returns_none(run):
+    processor = processor_with(ffmpeg_path="/nonexistent/ffmpeg")
+    assert run(processor._transcode_to_mp3(b"audio")) is None
+    assert run(processor.merge_audio_files(b"intro", b"main")) is None
@@ -0,0 +1,143 @@
+import time
+
+import pytest
+
+from services.audd_client import AudDAPIClient
+from services import recognition_router
+from services.http_client import get_http_client
+from services.recognition_router import RecognitionRouter
+from services.shazam_client import ShazamAPIClient
+
+AUDIO = b"not an mp3, sent as is"
+AUDD_MATCH = {"status": "success", "result": {"title": "Song", "artist": "AudD Artist"}}
+AUDD_NO_MATCH = {"status": "success", "result": None}
+SHAZAM_MATCH = {"track": {"title": "Song", "subtitle": "Shazam Artist"}}
+
+
+@pytest.fixture
+def providers(stub_server, monkeypatch):
+    """AudD and Shazam stubs whose reply and delay each test sets"""
+    behaviour = {"audd": (0.0, 200, AUDD_MATCH), "shazam": (0.0, 200, SHAZAM_MATCH)}
+
+    def responder(name):
+        def handle(method, path, body):
+            delay, status, payload = behaviour[name]
+            time.sleep(delay)
+            return status, payload
+        return handle
+
+    servers = {name: stub_server(responder(name)) for name in behaviour}
+    monkeypatch.setenv("AUDD_API_URL", f"{servers['audd'].url}/")
+    monkeypatch.setenv("SHAZAM_API_URL", f"{servers['shazam'].url}/recognize/")
+    monkeypatch.setenv("AUDD_API_TOKEN", "test")
+    monkeypatch.setenv("SHAZAM_API_KEY", "test")
+    return servers, behaviour
+
+
+def make_router(mode: str = "hedged", hedge_delay: float = 1.0) -> RecognitionRouter:
+    router = RecognitionRouter({"audd": AudDAPIClient(), "shazam": ShazamAPIClient()}, mode=mode)
+    router.default_hedge_delay = hedge_delay
+    return router
+
+
+def test_first_confident_provider_wins(providers, run):
+    servers, _ = providers
+
+    result = run(make_router().detect_song(AUDIO))
+    assert result["artist"] == "AudD Artist"
+    assert servers["shazam"].count() == 0
+
+
+def test_fails_over_when_a_provider_has_no_match(providers, run):
+    servers, behaviour = providers
+    behaviour["audd"] = (0.0, 200, AUDD_NO_MATCH)
+
+    result = run(make_router().detect_song(AUDIO))
+    assert result["artist"] == "Shazam Artist"
+    assert servers["audd"].count() == 1
+
+
+def test_fails_over_when_a_provider_errors(providers, run):
+    _, behaviour = providers
+    behaviour["audd"] = (0.0, 500, {})
+
+    assert run(make_router().detect_song(AUDIO))["artist"] == "Shazam Artist"
+
+
+def test_slow_provider_is_hedged_after_the_delay(providers, run):
+    servers, behaviour = providers
+    behaviour["audd"] = (1.0, 200, AUDD_MATCH)
+
+    async def scenario():
+        started = time.monotonic()
+        result = await make_router(hedge_delay=0.1).detect_song(AUDIO)
+        return result, time.monotonic() - started
+
+    result, elapsed = run(scenario())
+    assert result["artist"] == "Shazam Artist"
+    assert 0.1 <= elapsed < 0.8
+    assert servers["shazam"].count() == 1
+
+
+def test_race_mode_starts_every_provider_at_once(providers, run):
+    _, behaviour = providers
+    behaviour["audd"] = (0.5, 200, AUDD_MATCH)
+
+    async def scenario():
+        started = time.monotonic()
+        result = await make_router(mode="race", hedge_delay=5).detect_song(AUDIO)
+        return result, time.monotonic() - started
+
+    result, elapsed = run(scenario())
+    assert result["artist"] == "Shazam Artist"
+    assert elapsed < 0.4
+
+
+def test_failing_provider_is_ranked_last(providers, run):
+    servers, behaviour = providers
+    behaviour["audd"] = (0.0, 200, AUDD_NO_MATCH)
+    router = make_router()
+
+    async def scenario():
+        for _ in range(3):
+            await router.detect_song(AUDIO)
+
+    run(scenario())
+    assert router._ranked_providers() == ["shazam", "audd"]
+    assert servers["audd"].count() == 1
+    assert router.get_stats()["shazam"]["successes"] == 3
+
+
+def test_open_breaker_skips_the_provider_without_a_request(providers, run):
+    servers, behaviour = providers
+    behaviour["audd"] = (0.0, 500, {})
+
+    async def scenario():
+        http_client = get_http_client()
+        http_client.breaker_threshold = 2
+        results = []
+        # A fresh router each time keeps AudD ranked first, so only the breaker stops its requests
+        for _ in range(4):
+            results.append(await make_router().detect_song(AUDIO))
+        return results
+
+    results = run(scenario())
+    assert [result["artist"] for result in results] == ["Shazam Artist"] * 4
+    assert servers["audd"].count() == 2
+    assert servers["shazam"].count() == 4
+
+
+def test_samples_are_cut_once_for_every_provider(providers, run, monkeypatch):
+    servers, behaviour = providers
+    behaviour["audd"] = (0.0, 200, AUDD_NO_MATCH)
+    cuts = []
+
+    def sample_windows(data, duration, count=1):
+        cuts.append(data)
+        return [data]
+
+    monkeypatch.setattr(recognition_router, "sample_windows", sample_windows)
+    result = run(make_router(mode="race").detect_song(AUDIO))
+    assert result["artist"] == "Shazam Artist"
+    assert len(cuts) == 1
+    assert servers["audd"].count() == servers["shazam"].count() == 1
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.track_downloader import TrackDownloader
+
+
+class RangeServer:
+    """Serves one file with an ETag, answering Range requests only while If-Range still matches"""
+
+    def __init__(self, body: bytes, etag: str):
+        self.body, self.etag = body, etag
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.requests.append(dict(self.headers))
+                start = 0
+                range_header = self.headers.get("Range")
+                if range_header and self.headers.get("If-Range") == server.etag:
+                    start = int(range_header.split("=")[1].rstrip("-"))
+                if start >= len(server.body):
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(server.body)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206 if start else 200)
+                self.send_header("ETag", server.etag)
+                self.send_header("Content-Length", str(len(server.body) - start))
+                self.end_headers()
+                self.wfile.write(server.body[start:])
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/track.mp3"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def range_server():
+    servers = []
+
+    def start(body: bytes, etag: str = '"v1"') -> RangeServer:
+        servers.append(RangeServer(body, etag))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.server.shutdown()
+        server.server.server_close()
+
+
+def leave_partial(download_dir, name: str, data: bytes, validator: str = None):
+    with open(os.path.join(download_dir, f"{name}.part"), 'wb') as file:
+        file.write(data)
+    if validator:
+        with open(os.path.join(download_dir, f"{name}.part.validator"), 'w') as file:
+            file.write(validator)
+
+
+def test_cache_hit_uses_the_stored_digest(range_server, run, tmp_path, monkeypatch):
+    body = os.urandom(100_000)
+    server = range_server(body)
+    downloader = TrackDownloader(download_dir=str(tmp_path))
+
+    first = run(downloader.download(server.url, "track.mp3"))
+    monkeypatch.setattr(downloader, "_hash_file", lambda path: pytest.fail("cached track was rehashed"))
+    second = run(downloader.download(server.url, "track.mp3"))
+
+    assert first.sha256 == second.sha256 == hashlib.sha256(body).hexdigest()
+    assert len(server.requests) == 1
+
+
+def test_resumes_an_unchanged_file(range_server, run, tmp_path):
+    body = os.urandom(100_000)
+    server = range_server(body)
+    leave_partial(tmp_path, "track.mp3", body[:40_000], validator='"v1"')
+
+    result = run(TrackDownloader(download_dir=str(tmp_path)).download(server.url, "track.mp3"))
+    assert result.sha256 == hashlib.sha256(body).hexdigest()
+    assert server.requests[0]["Range"] == "bytes=40000-"
+    assert server.requests[0]["If-Range"] == '"v1"'
+
+
+def test_restarts_when_the_file_changed_upstream(range_server, run, tmp_path):
+    old, new = os.urandom(100_000), os.urandom(100_000)
+    server = range_server(new, etag='"v2"')
+    leave_partial(tmp_path, "track.mp3", old[:40_000], validator='"v1"')
+
+    result = run(TrackDownloader(download_dir=str(tmp_path)).download(server.url, "track.mp3"))
+    assert result.sha256 == hashlib.sha256(new).hexdigest()
+    with open(result.path, 'rb') as file:
+        assert file.read() == new
+
+
+def test_complete_partial_file_is_kept_on_416(range_server, run, tmp_path):
+    body = os.urandom(100_000)
+    server = range_server(body)
+    leave_partial(tmp_path, "track.mp3", body, validator='"v1"')
+
+    result = run(TrackDownloader(download_dir=str(tmp_path)).download(server.url, "track.mp3"))
+    assert result.sha256 == hashlib.sha256(body).hexdigest()
+    assert len(server.requests) == 1
+
+
+def test_oversized_partial_file_is_downloaded_again_on_416(range_server, run, tmp_path):
+    body = os.urandom(100_000)
+    server = range_server(body)
+    leave_partial(tmp_path, "track.mp3", body + os.urandom(10_000), validator='"v1"')
+
+    result = run(TrackDownloader(download_dir=str(tmp_path)).download(server.url, "track.mp3"))
+    assert (result.size, result.sha256) == (len(body), hashlib.sha256(body).hexdigest())
+    assert "Range" not in server.requests[1]
+
+
+def test_partial_file_without_validator_is_not_resumed(range_server, run, tmp_path):
+    body = os.urandom(100_000)
+    server = range_server(body)
+    leave_partial(tmp_path, "track.mp3", os.urandom(40_000))
+
+    result = run(TrackDownloader(download_dir=str(tmp_path)).download(server.url, "track.mp3"))
+    assert result.sha256 == hashlib.sha256(body).hexdigest()
+    assert "Range" not in server.requests[0]
+
+
+def test_abandoned_partial_downloads_are_evicted(range_server, run, tmp_path):
+    body = os.urandom(100_000)
+    server = range_server(body)
+    leave_partial(tmp_path, "abandoned.mp3", os.urandom(80_000), validator='"v0"')
+    os.utime(tmp_path / "abandoned.mp3.part", (0, 0))
+
+    downloader = TrackDownloader(download_dir=str(tmp_path), disk_budget=150_000)
+    run(downloader.download(server.url, "track.mp3"))
+    assert sorted(os.listdir(tmp_path)) == ["track.mp3", "track.mp3.sha256"]
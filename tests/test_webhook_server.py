@@ -0,0 +1,147 @@
+import asyncio
+import socket
+import time
+
+import httpx
+import pytest
+from telegram.ext import ApplicationBuilder, MessageHandler, filters
+
+from bot.update_processor import PerChatUpdateProcessor
+from bot.webhook_server import WebhookServer
+
+TOKEN = "123:TEST"
+SECRET = "secret"
+
+
+@pytest.fixture
+def telegram_api(stub_server):
+    """Stub Bot API answering getMe and setWebhook"""
+    def handle(method, path, body):
+        if path.endswith("/getMe"):
+            return 200, {"ok": True, "result": {"id": 123, "is_bot": True, "first_name": "Test", "username": "test_bot"}}
+        return 200, {"ok": True, "result": True}
+
+    return stub_server(handle)
+
+
+def message(update_id: int, chat_id: int, text: str) -> dict:
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "text": text,
+        "chat": {"id": chat_id, "type": "private"}, "from": {"id": chat_id, "is_bot": False, "first_name": "User"}
+    }}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_for(handled: list, count: int = 1):
+    for _ in range(100):
+        if len(handled) >= count:
+            return
+        await asyncio.sleep(0.02)
+
+
+def serve(run, telegram_api, scenario, handled: list, secret_token: str = SECRET):
+    """Run a one-worker webhook server in front of a real application and call scenario(post)"""
+    async def handle(update, context):
+        handled.append(("start", update.message.text))
+        await asyncio.sleep(0.2)
+        handled.append(("end", update.message.text))
+
+    def build_application():
+        application = (
+            ApplicationBuilder()
+            .token(TOKEN)
+            .base_url(f"{telegram_api.url}/bot")
+            .concurrent_updates(PerChatUpdateProcessor())
+            .build()
+        )
+        application.add_handler(MessageHandler(filters.TEXT, handle))
+        return application
+
+    port = free_port()
+    server = WebhookServer(build_application, TOKEN, workers=1, listen="127.0.0.1", port=port,
+                           url_path="telegram", webhook_url="https://example.invalid/telegram",
+                           secret_token=secret_token)
+
+    async def main():
+        serving = asyncio.create_task(server.run())
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            async def post(payload, secret: str = SECRET, **kwargs):
+                headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+                return await client.post("/telegram", json=payload, headers=headers, **kwargs)
+
+            for _ in range(100):
+                if serving.done():
+                    return await serving
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.05)
+            try:
+                return await scenario(post)
+            finally:
+                server.stop()
+                await serving
+
+    return run(main())
+
+
+def test_updates_reach_the_application_in_chat_order(run, telegram_api):
+    handled = []
+
+    async def scenario(post):
+        started = time.monotonic()
+        statuses = [(await post(update)).status_code for update in (
+            message(1, 10, "a1"), message(2, 10, "a2"), message(3, 20, "b1")
+        )]
+        await wait_for(handled, 6)
+        return statuses, time.monotonic() - started
+
+    statuses, elapsed = serve(run, telegram_api, scenario, handled)
+    assert statuses == [200, 200, 200]
+    # Chat 10 runs its updates one after the other while chat 20 runs alongside
+    chat_a = [event for event in handled if event[1].startswith("a")]
+    assert chat_a == [("start", "a1"), ("end", "a1"), ("start", "a2"), ("end", "a2")]
+    assert elapsed < 0.6
+    assert telegram_api.count(path=f"/bot{TOKEN}/setWebhook") == 1
+
+
+def test_wrong_secret_is_rejected(run, telegram_api):
+    handled = []
+
+    async def scenario(post):
+        response = await post(message(1, 10, "a1"), secret="wrong")
+        await asyncio.sleep(0.1)
+        return response.status_code
+
+    assert serve(run, telegram_api, scenario, handled) == 403
+    assert handled == []
+
+
+def test_malformed_updates_are_not_redelivered(run, telegram_api):
+    handled = []
+
+    async def scenario(post):
+        statuses = [
+            (await post(None, content=b"not json")).status_code,
+            (await post([1, 2])).status_code,
+            (await post({"update_id": 1, "message": {"chat": {"id": 10}}})).status_code,
+            (await post(message(2, 10, "a1"))).status_code,
+        ]
+        await wait_for(handled)
+        return statuses
+
+    statuses = serve(run, telegram_api, scenario, handled)
+    assert statuses == [400, 400, 200, 200]
+    assert handled[0] == ("start", "a1")
+
+
+def test_refuses_to_start_without_a_secret(run, telegram_api, monkeypatch):
+    monkeypatch.delenv("WEBHOOK_SECRET", raising=False)
+    with pytest.raises(RuntimeError):
+        serve(run, telegram_api, None, [], secret_token="")